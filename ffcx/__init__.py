@@ -12,12 +12,19 @@ FFCx compiles finite element variational forms into C code.
 
 import logging
 
-import pkg_resources
-
 # Import default parameters
 from ffcx.parameters import get_parameters  # noqa: F401
 
-__version__ = pkg_resources.get_distribution("fenics-ffcx").version
+try:
+    from importlib.metadata import version as _version
+except ImportError:
+    # Python < 3.8, where importing pkg_resources is considerably slower
+    import pkg_resources
+
+    def _version(distribution):
+        return pkg_resources.get_distribution(distribution).version
+
+__version__ = _version("fenics-ffcx")
 
 logging.basicConfig()
 logger = logging.getLogger("ffcx")
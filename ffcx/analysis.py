@@ -11,6 +11,7 @@ including automatic selection of elements, degrees and form
 representation type.
 """
 
+import functools
 import logging
 import typing
 from collections import namedtuple
@@ -18,6 +19,7 @@ from collections import namedtuple
 import numpy
 
 import ufl
+from ffcx import naming, parallel, profiling
 
 logger = logging.getLogger("ffcx")
 
@@ -28,7 +30,7 @@ ufl_data = namedtuple('ufl_data', ['form_data', 'unique_elements', 'element_numb
 
 def analyze_ufl_objects(ufl_objects: typing.Union[typing.List[ufl.form.Form], typing.List[ufl.FiniteElement],
                                                   typing.List],
-                        parameters: typing.Dict) -> ufl_data:
+                        parameters: typing.Dict, prefix: str = "") -> ufl_data:
     """Analyze ufl object(s).
 
     Parameters
@@ -36,6 +38,9 @@ def analyze_ufl_objects(ufl_objects: typing.Union[typing.List[ufl.form.Form], ty
     ufl_objects
     parameters
       FFCx parameters. These parameters take priority over all other set parameters.
+    prefix
+      Prefix of the names of the generated objects, under which forms
+      and expressions are profiled (as in the later stages).
 
     Returns
     -------
@@ -61,7 +66,19 @@ def analyze_ufl_objects(ufl_objects: typing.Union[typing.List[ufl.form.Form], ty
     # ufl_objects? Is this reasonable?
     if isinstance(ufl_objects[0], ufl.form.Form):
         forms = ufl_objects
-        form_data = tuple(_analyze_form(form, parameters) for form in forms)
+        for form in forms:
+            _prepare_form(form)
+
+        # The forms are independent, and may be analyzed by several
+        # workers
+        if profiling.active():
+            names = [naming.form_name(form, i, prefix) for i, form in enumerate(forms)]
+        else:
+            names = [None] * len(forms)
+        analyze = functools.partial(_analyze_form_task, parameters=parameters)
+        form_data = tuple(parallel.parallel_map(analyze, zip(names, forms), parameters))
+        for form, data in zip(forms, form_data):
+            _restore_original_objects(data, form)
 
         # Extract unique elements across forms
         for data in form_data:
@@ -79,7 +96,7 @@ def analyze_ufl_objects(ufl_objects: typing.Union[typing.List[ufl.form.Form], ty
         meshes = ufl_objects
         unique_coordinate_elements = [mesh.ufl_coordinate_element() for mesh in meshes]
     elif isinstance(ufl_objects[0], tuple) and isinstance(ufl_objects[0][0], ufl.core.expr.Expr):
-        for expression in ufl_objects:
+        for i, expression in enumerate(ufl_objects):
             original_expression = expression[0]
             points = expression[1]
             expression = expression[0]
@@ -87,7 +104,9 @@ def analyze_ufl_objects(ufl_objects: typing.Union[typing.List[ufl.form.Form], ty
             unique_elements.update(ufl.algorithms.extract_elements(expression))
             unique_elements.update(ufl.algorithms.extract_sub_elements(unique_elements))
 
-            expression = _analyze_expression(expression, parameters)
+            name = naming.expression_name((original_expression, points), prefix) if profiling.active() else None
+            with profiling.span("expression", name):
+                expression = _analyze_expression(expression, parameters)
             expressions.append((expression, points, original_expression))
     else:
         raise TypeError("UFL objects not recognised.")
@@ -95,8 +114,10 @@ def analyze_ufl_objects(ufl_objects: typing.Union[typing.List[ufl.form.Form], ty
     # Make sure coordinate elements and their subelements are included
     unique_elements.update(ufl.algorithms.analysis.extract_sub_elements(unique_coordinate_elements))
 
-    # Sort elements so sub-elements come before mixed elements
-    unique_elements = ufl.algorithms.sort_elements(unique_elements)
+    # Sort elements so sub-elements come before mixed elements. The set
+    # is ordered first, so that the numbering does not depend on the
+    # order in which the elements were found (e.g. by several workers).
+    unique_elements = ufl.algorithms.sort_elements(sorted(unique_elements, key=repr))
     unique_coordinate_elements = sorted(unique_coordinate_elements, key=lambda x: repr(x))
 
     # Compute dict (map) from element to index
@@ -126,24 +147,32 @@ def _analyze_expression(expression: ufl.core.expr.Expr, parameters: typing.Dict)
     return expression
 
 
-def _analyze_form(form: ufl.form.Form, parameters: typing.Dict) -> ufl.algorithms.formdata.FormData:
-    """Analyzes UFL form and attaches metadata.
+def _analyze_form_task(task, parameters: typing.Dict) -> ufl.algorithms.formdata.FormData:
+    """Analyze the form of a task (name of the form, form), recording a profiling span."""
+    name, form = task
+    with profiling.span("form", name):
+        return _analyze_form(form, parameters)
 
-    Parameters
-    ----------
-    form
-    parameters
 
-    Returns
-    -------
-    form_data -  Form data computed by UFL with metadata attached
+def _restore_original_objects(form_data: ufl.algorithms.formdata.FormData, form: ufl.form.Form):
+    """Make form data refer to the original form and coefficients.
+
+    Form data computed in a worker process refers to copies of these,
+    but the names of the objects (e.g. from a UFL file) are looked up by
+    object id in the later stages. The copies compare equal to the
+    originals, so that the form data is otherwise unchanged.
+    """
+    form_data.original_form = form
+    coefficients = form.coefficients()
+    form_data.reduced_coefficients = [coefficients[i] for i in form_data.original_coefficient_positions]
 
-    Note
-    ----
-    The main workload of this function is extraction of unique/default metadata
-    from parameters, integral metadata or inherited from UFL
-    (in case of quadrature degree)
 
+def _prepare_form(form: ufl.form.Form):
+    """Check that a form can be compiled, and set the default variant of its coordinate element.
+
+    This modifies the domain of the form, and is thus done before the
+    form is analyzed in a worker process, so that the form (and its
+    domain) is the same as after serial analysis.
     """
     if form.empty():
         raise RuntimeError(f"Form ({form}) seems to be zero: cannot compile it.")
@@ -160,19 +189,42 @@ def _analyze_form(form: ufl.form.Form, parameters: typing.Dict) -> ufl.algorithm
             equi_element = ufl.VectorElement(sub_element)
             form._integrals[0]._ufl_domain._ufl_coordinate_element = equi_element
 
+
+def _analyze_form(form: ufl.form.Form, parameters: typing.Dict) -> ufl.algorithms.formdata.FormData:
+    """Analyzes UFL form and attaches metadata.
+
+    Parameters
+    ----------
+    form
+    parameters
+
+    Returns
+    -------
+    form_data -  Form data computed by UFL with metadata attached
+
+    Note
+    ----
+    The main workload of this function is extraction of unique/default metadata
+    from parameters, integral metadata or inherited from UFL
+    (in case of quadrature degree)
+
+    """
+    _prepare_form(form)
+
     # Check for complex mode
     complex_mode = "_Complex" in parameters["scalar_type"]
 
     # Compute form metadata
-    form_data = ufl.algorithms.compute_form_data(
-        form,
-        do_apply_function_pullbacks=True,
-        do_apply_integral_scaling=True,
-        do_apply_geometry_lowering=True,
-        preserve_geometry_types=(ufl.classes.Jacobian,),
-        do_apply_restrictions=True,
-        do_append_everywhere_integrals=False,  # do not add dx integrals to dx(i) in UFL
-        complex_mode=complex_mode)
+    with profiling.step("compute_form_data", "analysis"):
+        form_data = ufl.algorithms.compute_form_data(
+            form,
+            do_apply_function_pullbacks=True,
+            do_apply_integral_scaling=True,
+            do_apply_geometry_lowering=True,
+            preserve_geometry_types=(ufl.classes.Jacobian,),
+            do_apply_restrictions=True,
+            do_append_everywhere_integrals=False,  # do not add dx integrals to dx(i) in UFL
+            complex_mode=complex_mode)
 
     # Determine unique quadrature degree, quadrature scheme and
     # precision per each integral data
@@ -216,10 +268,10 @@ def _analyze_form(form: ufl.form.Form, parameters: typing.Dict) -> ufl.algorithm
             # Extract quadrature rule
             qr = integral.metadata().get("quadrature_rule", qr_default)
 
-            logger.info(f"Integral {i}, integral group {id}:")
-            logger.info(f"--- quadrature rule: {qr}")
-            logger.info(f"--- quadrature degree: {qd}")
-            logger.info(f"--- precision: {p}")
+            logger.info("Integral %s, integral group %s:", i, id)
+            logger.info("--- quadrature rule: %s", qr)
+            logger.info("--- quadrature degree: %s", qd)
+            logger.info("--- precision: %s", p)
 
             # Update the old metadata
             metadata = integral.metadata()
@@ -0,0 +1,132 @@
+# Copyright (C) 2021 FEniCS Project
+#
+# This file is part of FFCx. (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""Build database of the command-line interface.
+
+The database is a JSON file in the output directory. It records for
+every UFL file compiled into the directory a signature of everything the
+generated code depends on: the contents of the UFL file and of the
+Python modules next to it that it imports, the parameters (except those
+that only control how the compiler runs), whether the code is split,
+the versions of FFCx, UFL and Basix, and the UFC header. It also records
+the names of the generated files. A UFL file with an unchanged signature, whose
+generated files all exist, need not be compiled again.
+
+The database is updated while holding an advisory lock, so that several
+processes may compile into the same output directory.
+"""
+
+import ast
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from ffcx import __version__ as FFCX_VERSION
+from ffcx import _version
+from ffcx.codegeneration import get_signature
+from ffcx.parameters import EXECUTION_PARAMETERS
+
+DB_FILENAME = ".ffcx-build.json"
+LOCK_FILENAME = ".ffcx-build.lock"
+
+# Parameters that do not change the generated code
+_IGNORED_PARAMETERS = EXECUTION_PARAMETERS + ("verbosity",)
+
+
+def signature(filename, parameters, split=False):
+    """Return the signature of the code generated from a UFL file with the given parameters.
+
+    The generated files also depend on whether the code is split into
+    one source file per object (see :func:`ffcx.formatting.write_code_split`).
+    """
+    # The versions of UFL and Basix are taken from their metadata, so
+    # that e.g. a client of a compile server does not import them
+    ufl_version, basix_version = _version("fenics-ufl"), _version("fenics-basix")
+
+    path = Path(filename)
+    source = path.read_bytes()
+    h = hashlib.sha1(source)
+    for module in _local_imports(source, path.parent):
+        h.update(module.name.encode("utf-8"))
+        h.update(module.read_bytes())
+    h.update(str(sorted((k, v) for k, v in parameters.items() if k not in _IGNORED_PARAMETERS)).encode("utf-8"))
+    h.update(f"split={bool(split)}".encode("utf-8"))
+    h.update(f"{FFCX_VERSION}{ufl_version}{basix_version}{get_signature()}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _local_imports(source, directory):
+    """Return the Python modules in a directory that are imported by the source of a UFL file."""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        # Reported when the file is compiled
+        return []
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module is not None:
+            names.add(node.module.split(".")[0])
+
+    modules = []
+    for name in sorted(names):
+        for candidate in (directory / f"{name}.py", directory / name / "__init__.py"):
+            if candidate.is_file():
+                modules.append(candidate)
+    return modules
+
+
+def load(output_dir):
+    """Return the build database of an output directory (empty if there is none)."""
+    try:
+        with open(Path(output_dir, DB_FILENAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def is_up_to_date(db, key, sig, output_dir):
+    """Return True if the files generated under a key have the given signature and all exist."""
+    entry = db.get(key)
+    if entry is None or entry["signature"] != sig:
+        return False
+    return all(Path(output_dir, f).is_file() for f in entry["outputs"])
+
+
+def update(output_dir, entries):
+    """Record the signatures and generated files of UFL files.
+
+    Parameters
+    ----------
+    output_dir : str
+        Output directory.
+    entries : dict
+        Mapping from key (the prefix of the generated files) to a pair
+        (signature, list of names of the generated files).
+
+    """
+    if not entries:
+        return
+    output_dir = Path(output_dir)
+    with open(output_dir.joinpath(LOCK_FILENAME), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            db = load(output_dir)
+            for key, (sig, outputs) in entries.items():
+                db[key] = {"signature": sig, "outputs": list(outputs)}
+
+            # Replace the database atomically, so that readers never see
+            # a partially written file
+            fd, tmp = tempfile.mkstemp(dir=output_dir, prefix=DB_FILENAME, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(db, f, indent=1, sort_keys=True)
+            os.replace(tmp, output_dir.joinpath(DB_FILENAME))
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -1,5 +1,6 @@
-import os
+import functools
 import hashlib
+import os
 
 # Version of FFCx header files
 __author__ = "FEniCS Project"
@@ -16,20 +17,14 @@ def get_include_path():
     return _include_path
 
 
-def _compute_signature():
+@functools.lru_cache(maxsize=None)
+def get_signature():
+    """Return SHA-1 hash of the contents of ufc.h.
+
+    In this implementation, the value is computed on first call.
+    """
     # Compute signature of ufc header files
     h = hashlib.sha1()
     with open(os.path.join(get_include_path(), "ufc.h")) as f:
         h.update(f.read().encode("utf-8"))
     return h.hexdigest()
-
-
-_signature = _compute_signature()
-
-
-def get_signature():
-    """Return SHA-1 hash of the contents of ufc.h.
-
-    In this implementation, the value is computed on import.
-    """
-    return _signature
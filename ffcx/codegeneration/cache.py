@@ -0,0 +1,402 @@
+# Copyright (C) 2021 FEniCS Project
+#
+# This file is part of FFCx. (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""Management of the on-disk JIT cache.
+
+For every compiled module the cache directory holds the generated C
+file, the object file, the shared library and a ``.c.cached`` marker
+file. A small index (JSON) records for each module the files that belong
+to it, their total size and the time of last access. The index is used
+to cap the cache in size and age with least-recently-used eviction.
+
+Compilations that fail are recorded as well, together with the error,
+the compiler log and the parameter signature, so that later requests for
+the same module fail immediately with the original diagnostics. Since
+the module name depends on the parameters and compiler flags, a change
+of these results in a fresh compilation; otherwise the failure record
+must be removed with :func:`clear_failures`.
+
+All reads and writes of the index are done while holding an advisory
+lock on a file in the cache directory, so that any number of processes
+may share one cache directory. A process compiling or loading a module
+also holds the lock ``locks/<module>.lock`` (see :func:`lock_module`),
+and modules whose lock is held are never evicted.
+
+The code generated by the compiler stages 1-3 is cached as well (see
+:func:`ffcx.compiler.compile_ufl_objects`), under a key that depends on
+the objects and the FFCx parameters but not on the compiler flags. A
+module rebuilt with other flags therefore only repeats the C
+compilation. Cached code is subject to the same eviction as modules.
+
+JIT compilations without a cache directory are done in a per-process
+scratch directory, which is removed when the process exits. The scratch
+directory is created with an unpredictable name and is private to the
+user. It holds a lock file, locked while the process runs, so that the
+scratch directories of processes that ended without removing theirs are
+found and removed.
+
+With a communicator, the ranks other than rank 0 load modules from
+copies in a node-local staging directory (see :func:`stage`), which is
+private to the user as well. Copies are checked against the module
+before they are reused, and removed once unused for a while.
+"""
+
+import atexit
+import contextlib
+import fcntl
+import filecmp
+import json
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import time
+from pathlib import Path
+
+logger = logging.getLogger("ffcx")
+
+INDEX_FILENAME = "ffcx-cache-index.json"
+LOCK_FILENAME = "ffcx-cache-index.lock"
+FAILURE_SUFFIX = ".failure.json"
+CODE_PREFIX = "ffcx-code-"
+SCRATCH_PREFIX = "ffcx-scratch-"
+SCRATCH_LOCK_FILENAME = "ffcx-scratch.lock"
+
+# Access times in the index are only refreshed if older than this
+# (seconds), to avoid rewriting the index on every cache hit
+ATIME_RESOLUTION = 60.0
+
+# Time (seconds) after which unused copies of modules in the staging
+# directory are removed
+STAGING_MAX_AGE = 24 * 3600.0
+
+
+@contextlib.contextmanager
+def _locked_index(cache_dir: Path):
+    """Hold an exclusive lock on the index of a cache directory and yield the index.
+
+    The (possibly modified) index is written back on exit.
+    """
+    cache_dir.mkdir(exist_ok=True, parents=True)
+    with open(cache_dir.joinpath(LOCK_FILENAME), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            index = _read_index(cache_dir)
+            original = json.dumps(index, sort_keys=True)
+            yield index
+            if json.dumps(index, sort_keys=True) != original:
+                _write_index(cache_dir, index)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_index(cache_dir: Path) -> dict:
+    try:
+        with open(cache_dir.joinpath(INDEX_FILENAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_index(cache_dir: Path, index: dict):
+    # Write to a temporary file first so that the index is replaced
+    # atomically and readers never see a partially written file
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=INDEX_FILENAME, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, cache_dir.joinpath(INDEX_FILENAME))
+
+
+def lock_module(cache_dir: Path, module_name: str, blocking: bool = True):
+    """Open and lock the lock file of a module, and return it (open), or None if not blocking and locked.
+
+    The lock file may be removed by :func:`evict` while other processes
+    wait for it, so the lock is only returned once it is held on the
+    file that is (still) in the lock directory.
+    """
+    filename = Path(cache_dir, "locks", module_name + ".lock")
+    filename.parent.mkdir(exist_ok=True, parents=True)
+    while True:
+        lock = open(filename, "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            lock.close()
+            return None
+        try:
+            if os.stat(filename).st_ino == os.fstat(lock.fileno()).st_ino:
+                return lock
+        except FileNotFoundError:
+            pass
+        lock.close()
+
+
+def module_files(cache_dir: Path, module_name: str):
+    """Return all files in the cache directory that belong to a module."""
+    return sorted(cache_dir.glob(module_name + ".*"))
+
+
+def record(cache_dir: Path, module_name: str, status: str = "ready"):
+    """Add (or refresh) the index entry of a module."""
+    files = module_files(cache_dir, module_name)
+    size = sum(f.stat().st_size for f in files if f.exists())
+    with _locked_index(cache_dir) as index:
+        index[module_name] = {"files": [f.name for f in files], "size": size, "atime": time.time(),
+                              "status": status}
+
+
+def record_failure(cache_dir: Path, module_name: str, error: str, log: str, parameter_signature: str):
+    """Record a failed compilation of a module."""
+    failure = {"error": error, "log": log, "parameters": parameter_signature, "time": time.time()}
+    filename = cache_dir.joinpath(module_name + FAILURE_SUFFIX)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=filename.name, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(failure, f)
+    os.replace(tmp, filename)
+
+
+def load_failure(cache_dir: Path, module_name: str):
+    """Return the record of a failed compilation of a module, or None."""
+    try:
+        with open(cache_dir.joinpath(module_name + FAILURE_SUFFIX)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def clear_failures(cache_dir: Path, module_name: str = None):
+    """Remove records of failed compilations, so that they are retried.
+
+    Parameters
+    ----------
+    cache_dir
+        Cache directory.
+    module_name
+        Module to retry. If None, all failed modules are retried.
+
+    Returns
+    -------
+    List of names of the modules whose records were removed.
+
+    """
+    cache_dir = Path(cache_dir)
+    pattern = ("*" if module_name is None else module_name) + FAILURE_SUFFIX
+    cleared = []
+    with _locked_index(cache_dir) as index:
+        for filename in cache_dir.glob(pattern):
+            name = filename.name[:-len(FAILURE_SUFFIX)]
+            filename.unlink()
+            index.pop(name, None)
+            cleared.append(name)
+    return cleared
+
+
+def load_code(cache_dir: Path, key: str):
+    """Return the generated code and object names stored under a key, or None."""
+    cache_dir = Path(cache_dir)
+    name = CODE_PREFIX + key
+    try:
+        with open(cache_dir.joinpath(name + ".json")) as f:
+            entry = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    touch(cache_dir, name)
+    return entry["code"], entry["names"]
+
+
+def store_code(cache_dir: Path, key: str, code, names):
+    """Store generated code and object names under a key."""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(exist_ok=True, parents=True)
+    name = CODE_PREFIX + key
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=name + ".json", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump({"code": code, "names": names}, f)
+    os.replace(tmp, cache_dir.joinpath(name + ".json"))
+    record(cache_dir, name)
+
+
+def touch(cache_dir: Path, module_name: str):
+    """Mark a module in the index as recently used."""
+    now = time.time()
+    with _locked_index(cache_dir) as index:
+        entry = index.get(module_name)
+        if entry is not None and now - entry["atime"] > ATIME_RESOLUTION:
+            entry["atime"] = now
+
+
+def size(cache_dir: Path) -> int:
+    """Return the total size (in bytes) of all modules in the index."""
+    return sum(entry["size"] for entry in _read_index(Path(cache_dir)).values())
+
+
+def evict(cache_dir: Path, max_size: int = None, max_age: float = None, keep=()):
+    """Remove modules from the cache until it satisfies the size and age limits.
+
+    Parameters
+    ----------
+    cache_dir
+        Cache directory.
+    max_size
+        Maximum total size (in bytes) of the cache. Least-recently used
+        modules are removed first.
+    max_age
+        Maximum time (in seconds) since a module was last used.
+    keep
+        Names of modules that must not be removed.
+
+    Returns
+    -------
+    List of names of the removed modules.
+
+    """
+    cache_dir = Path(cache_dir)
+    now = time.time()
+    evicted = []
+    with _locked_index(cache_dir) as index:
+        candidates = sorted((entry["atime"], name) for name, entry in index.items() if name not in keep)
+        total = sum(entry["size"] for entry in index.values())
+        for atime, name in candidates:
+            too_old = max_age is not None and now - atime > max_age
+            too_big = max_size is not None and total > max_size
+            if not (too_old or too_big):
+                continue
+
+            # Skip modules that another process is compiling or loading
+            lock_file = cache_dir.joinpath("locks", name + ".lock")
+            lock = None
+            if lock_file.exists():
+                lock = lock_module(cache_dir, name, blocking=False)
+                if lock is None:
+                    continue
+            try:
+                entry = index.pop(name)
+                for filename in entry["files"]:
+                    with contextlib.suppress(FileNotFoundError):
+                        cache_dir.joinpath(filename).unlink()
+                if lock is not None:
+                    lock_file.unlink()
+            finally:
+                if lock is not None:
+                    lock.close()
+            total -= entry["size"]
+            evicted.append(name)
+
+    if evicted:
+        logger.info(f"Evicted {len(evicted)} module(s) from JIT cache {cache_dir}")
+    return evicted
+
+
+def staging_dir() -> Path:
+    """Return the node-local directory into which modules are copied before they are loaded.
+
+    This is the directory given by the environment variable
+    ``FFCX_JIT_STAGING_DIR``, or else a directory in the temporary
+    directory of the system. It must be private to the user (see
+    :func:`check_private_directory`).
+    """
+    path = os.environ.get("FFCX_JIT_STAGING_DIR")
+    path = Path(path) if path else Path(tempfile.gettempdir()).joinpath(f"ffcx-staging-{os.getuid()}")
+    path.mkdir(mode=0o700, exist_ok=True, parents=True)
+    check_private_directory(path)
+    return path
+
+
+def stage(filename, max_age: float = STAGING_MAX_AGE) -> Path:
+    """Copy a compiled module into the staging directory (unless an identical copy is there), and return the copy.
+
+    Copies that have not been staged for more than ``max_age`` seconds
+    are removed.
+    """
+    filename = Path(filename)
+    directory = staging_dir()
+    staged = directory.joinpath(filename.name)
+    if staged.exists() and filecmp.cmp(filename, staged, shallow=False):
+        os.utime(staged)
+    else:
+        # Copy to a temporary file first, so that other processes on the
+        # node never load a partially written module
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=filename.name, suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(filename, tmp)
+        os.replace(tmp, staged)
+
+    now = time.time()
+    for path in directory.iterdir():
+        with contextlib.suppress(FileNotFoundError):
+            if path != staged and now - path.stat().st_mtime > max_age:
+                path.unlink()
+    return staged
+
+
+def check_private_directory(directory):
+    """Check that a directory is private to the user, raising PermissionError if not.
+
+    The directory must not be a symbolic link, must be owned by the user
+    and must have mode 0700, so that no other user can plant or replace
+    files in it.
+    """
+    directory = Path(directory)
+    info = os.lstat(directory)
+    if stat.S_ISLNK(info.st_mode):
+        raise PermissionError(f"Directory {directory} is a symbolic link.")
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"Directory {directory} is not a directory.")
+    if info.st_uid != os.getuid():
+        raise PermissionError(f"Directory {directory} is owned by another user.")
+    if stat.S_IMODE(info.st_mode) != 0o700:
+        raise PermissionError(f"Directory {directory} has mode {oct(stat.S_IMODE(info.st_mode))}, not 0o700.")
+
+
+_scratch_dirs = {}
+
+
+def scratch_dir() -> Path:
+    """Return the scratch directory of this process, creating it if needed.
+
+    Scratch directories of processes that no longer exist are removed.
+    """
+    pid = os.getpid()
+    if pid not in _scratch_dirs:
+        _remove_stale_scratch_dirs()
+        path = Path(tempfile.mkdtemp(prefix=SCRATCH_PREFIX))
+
+        # The lock is held until the process exits. It is taken on a
+        # temporary file that is then renamed, so that the lock file is
+        # never seen unlocked while the directory is in use.
+        fd, tmp = tempfile.mkstemp(dir=path, prefix=SCRATCH_LOCK_FILENAME, suffix=".tmp")
+        lock = os.fdopen(fd, "w")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        os.replace(tmp, path.joinpath(SCRATCH_LOCK_FILENAME))
+
+        _scratch_dirs[pid] = (path, lock)
+        atexit.register(_remove_scratch_dir, pid)
+    return _scratch_dirs[pid][0]
+
+
+def _remove_scratch_dir(pid):
+    # Only the process that created a scratch directory removes it
+    if pid == os.getpid():
+        path, lock = _scratch_dirs.pop(pid)
+        shutil.rmtree(path, ignore_errors=True)
+        lock.close()
+
+
+def _remove_stale_scratch_dirs():
+    """Remove the scratch directories of the user whose lock is not held by any process."""
+    for path in Path(tempfile.gettempdir()).glob(SCRATCH_PREFIX + "*"):
+        try:
+            check_private_directory(path)
+            lock = open(path.joinpath(SCRATCH_LOCK_FILENAME), "r")
+        except (PermissionError, FileNotFoundError):
+            # Of another user, or not (or no longer) a scratch directory
+            continue
+        with lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
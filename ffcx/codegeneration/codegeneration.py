@@ -11,9 +11,12 @@ UFC function from an intermediate representation (IR).
 
 """
 
+import functools
 import logging
+import re
 from collections import namedtuple
 
+from ffcx import naming, parallel, profiling
 from ffcx.codegeneration.dofmap import generator as dofmap_generator
 from ffcx.codegeneration.expressions import generator as expression_generator
 from ffcx.codegeneration.finite_element import \
@@ -25,6 +28,17 @@ logger = logging.getLogger("ffcx")
 
 code_blocks = namedtuple("code_blocks", ["elements", "dofmaps", "integrals", "forms", "expressions"])
 
+# Fields of the IR whose objects have content-addressed names with the
+# parameter "content_addressed_names"
+_CONTENT_ADDRESSED = ("elements", "dofmaps", "integrals")
+
+# Kind of object (in profiles) and code generator for each field of the IR
+_generators = {"elements": ("element", finite_element_generator),
+               "dofmaps": ("dofmap", dofmap_generator),
+               "integrals": ("integral", integral_generator),
+               "forms": ("form", form_generator),
+               "expressions": ("expression", expression_generator)}
+
 
 def generate_code(ir, parameters):
     """Generate code blocks from intermediate representation."""
@@ -32,12 +46,104 @@ def generate_code(ir, parameters):
     logger.info("Compiler stage 3: Generating code")
     logger.info(79 * "*")
 
-    # Generate code for finite_elements
-    code_finite_elements = [finite_element_generator(element_ir, parameters) for element_ir in ir.elements]
-    code_dofmaps = [dofmap_generator(dofmap_ir, parameters) for dofmap_ir in ir.dofmaps]
-    code_integrals = [integral_generator(integral_ir, parameters) for integral_ir in ir.integrals]
-    code_forms = [form_generator(form_ir, parameters) for form_ir in ir.forms]
-    code_expressions = [expression_generator(expression_ir, parameters) for expression_ir in ir.expressions]
+    # The objects are independent, and their code may be generated by
+    # several workers. The code blocks are in the order of the IR
+    # whatever the number of workers.
+    tasks = [(field, obj_ir) for field, irs in zip(ir._fields, ir) for obj_ir in irs]
+    code = parallel.parallel_map(functools.partial(_generate, parameters=parameters), tasks, parameters)
+
+    blocks = []
+    offset = 0
+    for irs in ir:
+        blocks.append(code[offset:offset + len(irs)])
+        offset += len(irs)
+
+    return code_blocks(*blocks)
+
+
+def generate_object_code(field, ir, parameters):
+    """Generate code for the IR of one object, in the given field of the IR ("elements", "integrals", etc.).
+
+    Returns the declaration and the implementation.
+    """
+    kind, generator = _generators[field]
+    if not profiling.active():
+        declaration, implementation = generator(ir, parameters)
+    else:
+        with profiling.span(kind, ir.name) as entry:
+            declaration, implementation = generator(ir, parameters)
+            entry["c_lines"] = declaration.count("\n") + implementation.count("\n")
+
+    if field in _CONTENT_ADDRESSED and parameters["content_addressed_names"]:
+        implementation = weak_definitions(ir.name, implementation)
+    return declaration, implementation
+
+
+def weak_definitions(name, implementation):
+    """Make the definitions of an object weak, and guard them against a second definition.
+
+    Objects with content-addressed names may be generated (identically)
+    from several UFL files or JIT groups. Their symbols, which are all
+    derived from the name of the object, are weak, so that the linker
+    keeps one definition, and a second definition in the same
+    translation unit is skipped.
+    """
+    symbols = sorted(set(re.findall(rf"\b\w*{re.escape(name)}\b", implementation)))
+    guard = f"FFCX_DEFINED_{name}"
+    pragmas = "".join(f"#pragma weak {symbol}\n" for symbol in symbols)
+    return f"\n#ifndef {guard}\n#define {guard}\n{implementation}\n{pragmas}#endif\n"
+
+
+def _generate(task, parameters):
+    """Generate code for a task (field of the IR, IR of an object)."""
+    field, ir = task
+    return generate_object_code(field, ir, parameters)
+
+
+def content_addressed_integral(name, code):
+    """Rename the code of an integral after its contents (see parameter "content_addressed_names").
+
+    Returns the new name and the renamed declaration and implementation.
+    """
+    declaration, implementation = code
+    new_name = naming.content_name("integral", (declaration + implementation).replace(name, "integral"))
+    return new_name, (declaration.replace(name, new_name), implementation.replace(name, new_name))
+
+
+def rename_references(code, names):
+    """Replace the names of objects (a mapping from old to new name) in the code of an object."""
+    declaration, implementation = code
+    for old_name, new_name in names.items():
+        declaration = declaration.replace(old_name, new_name)
+        implementation = implementation.replace(old_name, new_name)
+    return declaration, implementation
+
+
+def content_address_integrals(code, names):
+    """Rename all integrals after their contents, and the references to them in forms.
+
+    Integrals with the same code (e.g. of different forms) are then the
+    same, and only kept once.
+
+    Parameters
+    ----------
+    code : code_blocks
+        Code of all objects.
+    names : code_blocks
+        Names of all objects, in the same layout.
+
+    Returns
+    -------
+    The code and the names with renamed integrals.
 
-    return code_blocks(elements=code_finite_elements, dofmaps=code_dofmaps,
-                       integrals=code_integrals, forms=code_forms, expressions=code_expressions)
+    """
+    renames = {}
+    integrals, integral_names = [], []
+    for name, integral_code in zip(names.integrals, code.integrals):
+        new_name, integral_code = content_addressed_integral(name, integral_code)
+        renames[name] = new_name
+        if new_name not in integral_names:
+            integrals.append(integral_code)
+            integral_names.append(new_name)
+    forms = [rename_references(form_code, renames) for form_code in code.forms]
+    return code._replace(integrals=integrals, forms=forms), names._replace(integrals=integral_names)
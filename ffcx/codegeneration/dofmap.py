@@ -54,8 +54,8 @@ def tabulate_entity_dofs(L, entity_dofs, num_dofs_per_entity):
 def generator(ir, parameters):
     """Generate UFC code for a dofmap."""
     logger.info("Generating code for dofmap:")
-    logger.info(f"--- num element support dofs: {ir.num_element_support_dofs}")
-    logger.info(f"--- name: {ir.name}")
+    logger.info("--- num element support dofs: %s", ir.num_element_support_dofs)
+    logger.info("--- name: %s", ir.name)
 
     d = {}
 
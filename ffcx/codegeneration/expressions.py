@@ -19,8 +19,8 @@ logger = logging.getLogger("ffcx")
 def generator(ir, parameters):
     """Generate UFC code for an expression."""
     logger.info("Generating code for expression:")
-    logger.info(f"--- points: {ir.points}")
-    logger.info(f"--- name: {ir.name}")
+    logger.info("--- points: %s", ir.points)
+    logger.info("--- name: %s", ir.name)
 
     factory_name = ir.name
 
@@ -20,10 +20,10 @@ index_type = "int"
 def generator(ir, parameters):
     """Generate UFC code for a finite element."""
     logger.info("Generating code for finite element:")
-    logger.info(f"--- family: {ir.family}")
-    logger.info(f"--- degree: {ir.degree}")
-    logger.info(f"--- value shape: {ir.value_shape}")
-    logger.info(f"--- name: {ir.name}")
+    logger.info("--- family: %s", ir.family)
+    logger.info("--- degree: %s", ir.degree)
+    logger.info("--- value shape: %s", ir.value_shape)
+    logger.info("--- name: %s", ir.name)
 
     d = {}
     d["factory_name"] = ir.name
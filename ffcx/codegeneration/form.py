@@ -16,8 +16,8 @@ logger = logging.getLogger("ffcx")
 def generator(ir, parameters):
     """Generate UFC code for a form."""
     logger.info("Generating code for form:")
-    logger.info(f"--- rank: {ir.rank}")
-    logger.info(f"--- name: {ir.name}")
+    logger.info("--- rank: %s", ir.rank)
+    logger.info("--- name: %s", ir.name)
 
     import ffcx.codegeneration.C.cnodes as L
 
@@ -23,8 +23,8 @@ logger = logging.getLogger("ffcx")
 
 def generator(ir, parameters):
     logger.info("Generating code for integral:")
-    logger.info(f"--- type: {ir.integral_type}")
-    logger.info(f"--- name: {ir.name}")
+    logger.info("--- type: %s", ir.integral_type)
+    logger.info("--- name: %s", ir.name)
 
     """Generate code for an integral."""
     factory_name = ir.name
@@ -80,6 +80,12 @@ def generator(ir, parameters):
         np_scalar_type=cdtype_to_numpy(parameters["scalar_type"]),
         coordinate_element=L.AddressOf(L.Symbol(ir.coordinate_element)))
 
+    if parameters["content_addressed_names"]:
+        # Declare the coordinate element here, so that the integral can be
+        # compiled on its own without the header, which changes with the
+        # other objects
+        implementation = f"\nextern ufc_finite_element {ir.coordinate_element};\n" + implementation
+
     return declaration, implementation
 
 
@@ -5,254 +5,1093 @@
 # SPDX-License-Identifier:    LGPL-3.0-or-later
 
 from contextlib import redirect_stdout
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import hashlib
 import importlib
 import io
+import json
 import logging
 import os
 import re
-import tempfile
+import threading
 import time
+import traceback
 from pathlib import Path
 
-import cffi
 import ffcx
-import ffcx.naming
+from ffcx import profiling
+from ffcx.codegeneration import cache
 
 logger = logging.getLogger("ffcx")
 
-# Get declarations directly from ufc.h
-file_dir = os.path.dirname(os.path.abspath(__file__))
-with open(file_dir + "/ufc.h", "r") as f:
-    ufc_h = ''.join(f.readlines())
 
-header = ufc_h.split("<HEADER_DECL>")[1].split("</HEADER_DECL>")[0].strip(" /\n")
-header = header.replace("{", "{{").replace("}", "}}")
-UFC_HEADER_DECL = header + "\n"
+@functools.lru_cache(maxsize=None)
+def _ufc_declarations():
+    """Return the declarations of the UFC types for cffi, parsed from ufc.h on first use."""
+    file_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(file_dir + "/ufc.h", "r") as f:
+        ufc_h = ''.join(f.readlines())
 
-UFC_ELEMENT_DECL = '\n'.join(re.findall('typedef struct ufc_finite_element.*?ufc_finite_element;', ufc_h, re.DOTALL))
-UFC_DOFMAP_DECL = '\n'.join(re.findall('typedef struct ufc_dofmap.*?ufc_dofmap;', ufc_h, re.DOTALL))
-UFC_FORM_DECL = '\n'.join(re.findall('typedef struct ufc_form.*?ufc_form;', ufc_h, re.DOTALL))
+    header = ufc_h.split("<HEADER_DECL>")[1].split("</HEADER_DECL>")[0].strip(" /\n")
+    header = header.replace("{", "{{").replace("}", "}}")
+    decls = {"UFC_HEADER_DECL": header + "\n"}
 
-UFC_INTEGRAL_DECL = '\n'.join(re.findall(r'typedef void ?\(ufc_tabulate_tensor_float32\).*?\);', ufc_h, re.DOTALL))
-UFC_INTEGRAL_DECL += '\n'.join(re.findall(r'typedef void ?\(ufc_tabulate_tensor_float64\).*?\);', ufc_h, re.DOTALL))
-UFC_INTEGRAL_DECL += '\n'.join(re.findall(r'typedef void ?\(ufc_tabulate_tensor_complex64\).*?\);', ufc_h, re.DOTALL))
-UFC_INTEGRAL_DECL += '\n'.join(re.findall(r'typedef void ?\(ufc_tabulate_tensor_complex128\).*?\);', ufc_h, re.DOTALL))
-UFC_INTEGRAL_DECL += '\n'.join(re.findall(r'typedef void ?\(ufc_tabulate_tensor_longdouble\).*?\);', ufc_h, re.DOTALL))
+    decls["UFC_ELEMENT_DECL"] = '\n'.join(re.findall('typedef struct ufc_finite_element.*?ufc_finite_element;',
+                                                     ufc_h, re.DOTALL))
+    decls["UFC_DOFMAP_DECL"] = '\n'.join(re.findall('typedef struct ufc_dofmap.*?ufc_dofmap;', ufc_h, re.DOTALL))
+    decls["UFC_FORM_DECL"] = '\n'.join(re.findall('typedef struct ufc_form.*?ufc_form;', ufc_h, re.DOTALL))
 
-UFC_INTEGRAL_DECL += '\n'.join(re.findall('typedef struct ufc_integral.*?ufc_integral;',
-                                          ufc_h, re.DOTALL))
-UFC_EXPRESSION_DECL = '\n'.join(re.findall('typedef struct ufc_expression.*?ufc_expression;', ufc_h, re.DOTALL))
+    integral_decl = ""
+    for scalar in ("float32", "float64", "complex64", "complex128", "longdouble"):
+        integral_decl += '\n'.join(re.findall(rf'typedef void ?\(ufc_tabulate_tensor_{scalar}\).*?\);', ufc_h,
+                                              re.DOTALL))
+    integral_decl += '\n'.join(re.findall('typedef struct ufc_integral.*?ufc_integral;', ufc_h, re.DOTALL))
+    decls["UFC_INTEGRAL_DECL"] = integral_decl
+    decls["UFC_EXPRESSION_DECL"] = '\n'.join(re.findall('typedef struct ufc_expression.*?ufc_expression;', ufc_h,
+                                                        re.DOTALL))
+    return decls
+
+
+def __getattr__(name):
+    # The UFC_*_DECL module attributes are computed on first access
+    try:
+        return _ufc_declarations()[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+
+def _module_declarations(scalar_type, kinds):
+    """Return the declarations of the UFC header and of the UFC types of the given kinds."""
+    decls = _ufc_declarations()
+    return decls["UFC_HEADER_DECL"].format(scalar_type) + "".join(decls[f"UFC_{kind}_DECL"] for kind in kinds)
+
+
+# Modules compiled or loaded by this process, keyed by (cache directory,
+# module name), and the locks that serialise work on each key
+_modules = {}
+_module_locks = {}
+_registry_lock = threading.Lock()
+
+# Kernel bundles loaded with load_bundle, and whether those listed in the
+# environment variable FFCX_JIT_BUNDLES have been loaded
+_bundles = []
+_bundles_from_environment = False
+
+# Worker pool of the asynchronous JIT API. Work submitted to it goes
+# through the same registry and cache as synchronous calls, so a module
+# is never compiled twice.
+_executor = None
+
+# Event set once the code of a module compiled in the current context
+# has been generated (and stored in the code cache), see _compile_tiered
+_code_generated = contextvars.ContextVar("_code_generated", default=None)
+
+
+# Cache and compile-time metrics of this process, see get_metrics
+METRIC_COUNTERS = ("memory_hits", "bundle_hits", "disk_hits", "waits", "misses", "failures")
+METRIC_STAGES = ("analysis", "ir", "codegen", "formatting", "cffi_source", "c_compile", "module_load",
+                 "lock_wait")
+_metrics_lock = threading.Lock()
+
+
+def _new_metrics():
+    return {"counters": dict.fromkeys(METRIC_COUNTERS, 0), "times": dict.fromkeys(METRIC_STAGES, 0.0),
+            "bytes_written": 0, "cache_size": {}}
+
+
+_metrics = _new_metrics()
+
+
+def _count(counter, n=1):
+    with _metrics_lock:
+        _metrics["counters"][counter] += n
+
+
+def _add_times(times):
+    with _metrics_lock:
+        for stage, seconds in times.items():
+            _metrics["times"][stage] += seconds
+
+
+def _add_bytes_written(nbytes):
+    with _metrics_lock:
+        _metrics["bytes_written"] += nbytes
+
+
+def _set_cache_size(cache_dir, nbytes):
+    with _metrics_lock:
+        _metrics["cache_size"][str(cache_dir)] = nbytes
+
+
+def get_metrics() -> dict:
+    """Return the JIT cache and compile-time metrics of this process.
+
+    Returns
+    -------
+    Dictionary with
+
+    ``counters``
+        Number of modules found in the in-process registry
+        (``memory_hits``), in a kernel bundle (``bundle_hits``) and in the
+        cache directory (``disk_hits``), number of times another process
+        or thread was compiling the requested module (``waits``), number
+        of compilations (``misses``) and of failed compilations
+        (``failures``).
+    ``times``
+        Total time (in seconds) spent in each stage: the compiler stages
+        ``analysis``, ``ir``, ``codegen`` and ``formatting`` (summed over
+        concurrently generated groups), parsing of the declarations by
+        cffi (``cffi_source``), generation and compilation of the C code
+        (``c_compile``), loading of modules (``module_load``) and waiting
+        for other compilations (``lock_wait``).
+    ``bytes_written``
+        Total size of the files of compiled modules.
+    ``cache_size``
+        Size (in bytes) of each shared cache directory after the last
+        compilation into it.
+
+    """
+    with _metrics_lock:
+        return json.loads(json.dumps(_metrics))
+
+
+def reset_metrics():
+    """Reset all JIT metrics of this process to zero."""
+    global _metrics
+    with _metrics_lock:
+        _metrics = _new_metrics()
+
+
+def dump_metrics(path=None) -> str:
+    """Return the JIT metrics of this process as JSON, and write them to a file if a path is given."""
+    metrics = get_metrics()
+    metrics["pid"] = os.getpid()
+    metrics["time"] = time.time()
+    s = json.dumps(metrics, indent=2, sort_keys=True)
+    if path is not None:
+        Path(path).write_text(s)
+    return s
+
+
+class SerialCommunicator:
+    """Stand-in for an MPI communicator of a single process, for the ``comm`` argument of the JIT."""
+
+    rank = 0
+    size = 1
+
+    def bcast(self, obj, root=0):
+        return obj
+
+    def barrier(self):
+        pass
+
+
+def _module_name(prefix, cffi_extra_compile_args, cffi_debug):
+    """Return the name of the module of code generated with a prefix and compiled with the given flags.
+
+    The generated code (and hence the prefix) does not depend on the
+    compiler flags, so that it can be reused from the cache when only the
+    flags change.
+    """
+    flags = hashlib.sha1((str(cffi_extra_compile_args) + str(cffi_debug)).encode("utf-8")).hexdigest()
+    return f"{prefix}_{flags[:16]}"
+
+
+def _module_lock(key):
+    with _registry_lock:
+        return _module_locks.setdefault(key, threading.Lock())
+
+
+def clear_module_registry():
+    """Forget all modules compiled or loaded by this process.
+
+    Subsequent JIT calls go through the cache directory again.
+    """
+    with _registry_lock:
+        _modules.clear()
 
 
 def _compute_parameter_signature(parameters):
     """Return parameters signature (some parameters should not affect signature)."""
-    return str(sorted(parameters.items()))
+    return str(sorted((k, v) for k, v in parameters.items() if k not in ffcx.parameters.EXECUTION_PARAMETERS))
 
 
 def get_cached_module(module_name, object_names, cache_dir, timeout):
-    """Look for an existing C file and wait for compilation, or if it does not exist, create it."""
+    """Load a module from the cache, or acquire the right to compile it.
+
+    Compilation of a module is guarded by an advisory lock, held by the
+    compiling process until the module is ready. Other processes wait on
+    the lock and load the module as soon as it is released. A lock held
+    by a process that has died is released by the operating system, so
+    abandoned compilations are taken over without delay.
+
+    Returns
+    -------
+    (objects, module, None) if the module is in the cache, or
+    (None, None, lock) if the caller must compile the module. The caller
+    holds the lock until it closes the returned lock file.
+
+    """
     cache_dir = Path(cache_dir)
     c_filename = cache_dir.joinpath(module_name).with_suffix(".c")
     ready_name = c_filename.with_suffix(".c.cached")
 
-    # Ensure cache dir exists
-    cache_dir.mkdir(exist_ok=True, parents=True)
+    lock = cache.lock_module(cache_dir, module_name, blocking=False)
+    if lock is None:
+        _count("waits")
+        logger.debug(f"Waiting for compilation of {c_filename}.")
+        t0 = time.time()
+        lock = _wait_for_lock(cache_dir, module_name, timeout)
+        if lock is None:
+            raise TimeoutError(f"""JIT compilation timed out waiting for another process to compile {c_filename}.
+        Increase timeout parameter.""")
+        _add_times({"lock_wait": time.time() - t0})
 
-    try:
-        # Create C file with exclusive access
-        open(c_filename, "x")
-        return None, None
-    except FileExistsError:
+    if ready_name.exists():
         logger.info("Cached C file already exists: " + str(c_filename))
-        finder = importlib.machinery.FileFinder(
-            str(cache_dir), (importlib.machinery.ExtensionFileLoader, importlib.machinery.EXTENSION_SUFFIXES))
-        finder.invalidate_caches()
+        try:
+            compiled_objects, compiled_module = _load_objects(cache_dir, module_name, object_names)
+        finally:
+            lock.close()
+        _count("disk_hits")
+        return compiled_objects, compiled_module, None
+
+    failure = cache.load_failure(cache_dir, module_name)
+    if failure is not None:
+        lock.close()
+        raise RuntimeError(f"""JIT compilation of {module_name} failed previously with:
+{failure["error"]}
+{failure["log"]}
+        To retry, call ffcx.codegeneration.cache.clear_failures("{cache_dir}", "{module_name}").""")
+
+    if c_filename.exists():
+        logger.info(f"Taking over abandoned compilation of {c_filename}.")
+
+    return None, None, lock
+
+
+def _wait_for_lock(cache_dir, module_name, timeout):
+    """Wait for the lock of a module, for at most timeout seconds, and return it (or None if timed out).
+
+    The lock is waited for in a blocking call in a helper thread, so that
+    the caller is woken up as soon as the lock is released. A lock that
+    the helper thread only acquires after the timeout is released again.
+    """
+    state = {"lock": None, "error": None, "abandoned": False}
+    guard = threading.Lock()
 
-        # Now, wait for ready
-        for i in range(timeout):
-            if os.path.exists(ready_name):
-                spec = finder.find_spec(module_name)
-                if spec is None:
-                    raise ModuleNotFoundError("Unable to find JIT module.")
-                compiled_module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(compiled_module)
+    def wait():
+        try:
+            lock = cache.lock_module(cache_dir, module_name)
+        except Exception as e:
+            lock = None
+            state["error"] = e
+        with guard:
+            if state["abandoned"] and lock is not None:
+                lock.close()
+            else:
+                state["lock"] = lock
 
-                compiled_objects = [getattr(compiled_module.lib, name) for name in object_names]
-                return compiled_objects, compiled_module
+    thread = threading.Thread(target=wait, name="ffcx-jit-lock", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    with guard:
+        state["abandoned"] = True
+        if state["error"] is not None:
+            raise state["error"]
+        return state["lock"]
 
-            logger.info(f"Waiting for {ready_name} to appear.")
-            time.sleep(1)
-        raise TimeoutError(f"""JIT compilation timed out, probably due to a failed previous compile.
-        Try cleaning cache (e.g. remove {c_filename}) or increase timeout parameter.""")
+
+def _signature_scope(function):
+    """Memoize the signatures of UFL expressions while a function runs (see :func:`ffcx.naming.signature_scope`)."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        import ffcx.naming
+
+        with ffcx.naming.signature_scope():
+            return function(*args, **kwargs)
+    return wrapper
 
 
 def compile_elements(elements, parameters=None, cache_dir=None, timeout=10, cffi_extra_compile_args=None,
-                     cffi_verbose=False, cffi_debug=None, cffi_libraries=None):
-    """Compile a list of UFL elements and dofmaps into Python objects."""
+                     cffi_verbose=False, cffi_debug=None, cffi_libraries=None, cffi_jobs=1,
+                     cache_max_size=None, cache_max_age=None, comm=None):
+    """Compile a list of UFL elements and dofmaps into Python objects.
+
+    Parameters
+    ----------
+    elements
+        List of UFL elements.
+    cffi_jobs
+        Number of C compiler processes to run concurrently. If larger than
+        one, every element, dofmap, integral, form and expression is
+        emitted into its own translation unit, and the units are compiled
+        in parallel and linked into one extension module.
+    cache_max_size
+        Maximum total size (in bytes) of ``cache_dir``. When exceeded after a
+        compilation, least-recently used modules are evicted.
+    cache_max_age
+        Maximum time (in seconds) since a module in ``cache_dir`` was last used.
+        Older modules are evicted after a compilation.
+    comm
+        Communicator (e.g. an mpi4py communicator, or a
+        :class:`SerialCommunicator`) with ``rank`` and ``bcast``. If given,
+        the call is collective: rank 0 compiles (or loads) the module and
+        broadcasts its location, and the other ranks load a node-local copy.
+        ``cache_dir`` must then be given, on a file system shared by all
+        ranks.
+
+    """
+    import ffcx.naming
+
     p = ffcx.parameters.get_parameters(parameters)
 
+    found = _find_in_bundles(elements, p)
+    if found is not None:
+        return found[0], found[1], (None, None)
+
     # Get a signature for these elements
-    module_name = 'libffcx_elements_' + \
-        ffcx.naming.compute_signature(elements, _compute_parameter_signature(p)
-                                      + str(cffi_extra_compile_args) + str(cffi_debug))
+    prefix = 'libffcx_elements_' + ffcx.naming.compute_signature(elements, _compute_parameter_signature(p))
+    module_name = _module_name(prefix, cffi_extra_compile_args, cffi_debug)
 
     names = []
+    element_prefix = ffcx.naming.element_prefix(prefix, p)
     for e in elements:
-        name = ffcx.naming.finite_element_name(e, module_name)
+        name = ffcx.naming.finite_element_name(e, element_prefix)
         names.append(name)
-        name = ffcx.naming.dofmap_name(e, module_name)
+        name = ffcx.naming.dofmap_name(e, element_prefix)
         names.append(name)
 
-    if cache_dir is not None:
-        cache_dir = Path(cache_dir)
-        obj, mod = get_cached_module(module_name, names, cache_dir, timeout)
-        if obj is not None:
-            # Pair up elements with dofmaps
-            obj = list(zip(obj[::2], obj[1::2]))
-            return obj, mod, (None, None)
-    else:
-        cache_dir = Path(tempfile.mkdtemp())
+    decl = _module_declarations(p["scalar_type"], ("ELEMENT", "DOFMAP"))
+    element_template = "extern ufc_finite_element {name};\n"
+    dofmap_template = "extern ufc_dofmap {name};\n"
+    for i in range(len(elements)):
+        decl += element_template.format(name=names[i * 2])
+        decl += dofmap_template.format(name=names[i * 2 + 1])
 
-    try:
-        decl = UFC_HEADER_DECL.format(p["scalar_type"]) + UFC_ELEMENT_DECL + UFC_DOFMAP_DECL
-        element_template = "extern ufc_finite_element {name};\n"
-        dofmap_template = "extern ufc_dofmap {name};\n"
-        for i in range(len(elements)):
-            decl += element_template.format(name=names[i * 2])
-            decl += dofmap_template.format(name=names[i * 2 + 1])
-
-        impl = _compile_objects(decl, elements, names, module_name, p, cache_dir,
-                                cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries)
-    except Exception:
-        # remove c file so that it will not timeout next time
-        c_filename = cache_dir.joinpath(module_name + ".c")
-        os.replace(c_filename, c_filename.with_suffix(".c.failed"))
-        raise
-
-    objects, module = _load_objects(cache_dir, module_name, names)
+    objects, module, code = _compile_module(decl, [(elements, prefix)], names, module_name, p, cache_dir, timeout,
+                                            cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries,
+                                            cffi_jobs, cache_max_size, cache_max_age, comm)
     # Pair up elements with dofmaps
     objects = list(zip(objects[::2], objects[1::2]))
-    return objects, module, (decl, impl)
+    return objects, module, code
 
 
 def compile_forms(forms, parameters=None, cache_dir=None, timeout=10, cffi_extra_compile_args=None,
-                  cffi_verbose=False, cffi_debug=None, cffi_libraries=None):
-    """Compile a list of UFL forms into UFC Python objects."""
+                  cffi_verbose=False, cffi_debug=None, cffi_libraries=None, cffi_jobs=1,
+                  cache_max_size=None, cache_max_age=None, comm=None):
+    """Compile a list of UFL forms into UFC Python objects.
+
+    Parameters
+    ----------
+    forms
+        List of UFL forms.
+    cffi_jobs
+        Number of C compiler processes to run concurrently. If larger than
+        one, every element, dofmap, integral, form and expression is
+        emitted into its own translation unit, and the units are compiled
+        in parallel and linked into one extension module.
+    cache_max_size
+        Maximum total size (in bytes) of ``cache_dir``. When exceeded after a
+        compilation, least-recently used modules are evicted.
+    cache_max_age
+        Maximum time (in seconds) since a module in ``cache_dir`` was last used.
+        Older modules are evicted after a compilation.
+    comm
+        Communicator (e.g. an mpi4py communicator, or a
+        :class:`SerialCommunicator`) with ``rank`` and ``bcast``. If given,
+        the call is collective: rank 0 compiles (or loads) the module and
+        broadcasts its location, and the other ranks load a node-local copy.
+        ``cache_dir`` must then be given, on a file system shared by all
+        ranks.
+
+    """
+    import ffcx.naming
+
     p = ffcx.parameters.get_parameters(parameters)
 
+    found = _find_in_bundles(forms, p)
+    if found is not None:
+        return found[0], found[1], (None, None)
+
     # Get a signature for these forms
-    module_name = 'libffcx_forms_' + \
-        ffcx.naming.compute_signature(forms, _compute_parameter_signature(p)
-                                      + str(cffi_extra_compile_args) + str(cffi_debug))
+    prefix = 'libffcx_forms_' + ffcx.naming.compute_signature(forms, _compute_parameter_signature(p))
+    module_name = _module_name(prefix, cffi_extra_compile_args, cffi_debug)
 
-    form_names = [ffcx.naming.form_name(form, i, module_name) for i, form in enumerate(forms)]
+    form_names = [ffcx.naming.form_name(form, i, prefix) for i, form in enumerate(forms)]
 
-    if cache_dir is not None:
-        cache_dir = Path(cache_dir)
-        obj, mod = get_cached_module(module_name, form_names, cache_dir, timeout)
-        if obj is not None:
-            return obj, mod, (None, None)
-    else:
-        cache_dir = Path(tempfile.mkdtemp())
+    decl = _module_declarations(p["scalar_type"], ("ELEMENT", "DOFMAP", "INTEGRAL", "FORM"))
 
-    try:
-        decl = UFC_HEADER_DECL.format(p["scalar_type"]) + UFC_ELEMENT_DECL + UFC_DOFMAP_DECL + \
-            UFC_INTEGRAL_DECL + UFC_FORM_DECL
-
-        form_template = "extern ufc_form {name};\n"
-        for name in form_names:
-            decl += form_template.format(name=name)
-
-        impl = _compile_objects(decl, forms, form_names, module_name, p, cache_dir,
-                                cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries)
-    except Exception:
-        # remove c file so that it will not timeout next time
-        c_filename = cache_dir.joinpath(module_name + ".c")
-        os.replace(c_filename, c_filename.with_suffix(".c.failed"))
-        raise
-
-    obj, module = _load_objects(cache_dir, module_name, form_names)
-    return obj, module, (decl, impl)
+    form_template = "extern ufc_form {name};\n"
+    for name in form_names:
+        decl += form_template.format(name=name)
+
+    return _compile_module(decl, [(forms, prefix)], form_names, module_name, p, cache_dir, timeout,
+                           cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries,
+                           cffi_jobs, cache_max_size, cache_max_age, comm)
 
 
+@_signature_scope
 def compile_expressions(expressions, parameters=None, cache_dir=None, timeout=10, cffi_extra_compile_args=None,
-                        cffi_verbose=False, cffi_debug=None, cffi_libraries=None):
+                        cffi_verbose=False, cffi_debug=None, cffi_libraries=None, cffi_jobs=1,
+                        cache_max_size=None, cache_max_age=None, comm=None):
     """Compile a list of UFL expressions into UFC Python objects.
 
     Parameters
     ----------
     expressions
         List of (UFL expression, evaluation points).
+    cffi_jobs
+        Number of C compiler processes to run concurrently. If larger than
+        one, every element, dofmap, integral, form and expression is
+        emitted into its own translation unit, and the units are compiled
+        in parallel and linked into one extension module.
+    cache_max_size
+        Maximum total size (in bytes) of ``cache_dir``. When exceeded after a
+        compilation, least-recently used modules are evicted.
+    cache_max_age
+        Maximum time (in seconds) since a module in ``cache_dir`` was last used.
+        Older modules are evicted after a compilation.
+    comm
+        Communicator (e.g. an mpi4py communicator, or a
+        :class:`SerialCommunicator`) with ``rank`` and ``bcast``. If given,
+        the call is collective: rank 0 compiles (or loads) the module and
+        broadcasts its location, and the other ranks load a node-local copy.
+        ``cache_dir`` must then be given, on a file system shared by all
+        ranks.
 
     """
+    import ffcx.naming
+
     p = ffcx.parameters.get_parameters(parameters)
 
-    module_name = 'libffcx_expressions_' + \
-        ffcx.naming.compute_signature(expressions, _compute_parameter_signature(p)
-                                      + str(cffi_extra_compile_args) + str(cffi_debug))
-    expr_names = [ffcx.naming.expression_name(expression, module_name) for expression in expressions]
+    found = _find_in_bundles(expressions, p)
+    if found is not None:
+        return found[0], found[1], (None, None)
 
-    if cache_dir is not None:
-        cache_dir = Path(cache_dir)
-        obj, mod = get_cached_module(module_name, expr_names, cache_dir, timeout)
-        if obj is not None:
-            return obj, mod, (None, None)
+    prefix = 'libffcx_expressions_' + ffcx.naming.compute_signature(expressions, _compute_parameter_signature(p))
+    module_name = _module_name(prefix, cffi_extra_compile_args, cffi_debug)
+    expr_names = [ffcx.naming.expression_name(expression, prefix) for expression in expressions]
+
+    decl = _module_declarations(p["scalar_type"], ("ELEMENT", "DOFMAP", "INTEGRAL", "FORM", "EXPRESSION"))
+
+    expression_template = "extern ufc_expression {name};\n"
+    for name in expr_names:
+        decl += expression_template.format(name=name)
+
+    return _compile_module(decl, [(expressions, prefix)], expr_names, module_name, p, cache_dir, timeout,
+                           cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries,
+                           cffi_jobs, cache_max_size, cache_max_age, comm)
+
+
+@_signature_scope
+def compile_batch(ufl_objects, parameters=None, cache_dir=None, timeout=10, cffi_extra_compile_args=None,
+                  cffi_verbose=False, cffi_debug=None, cffi_libraries=None, cffi_jobs=1,
+                  cache_max_size=None, cache_max_age=None, max_module_objects=64, max_workers=None):
+    """Compile a list of UFL forms, elements and (expression, points) pairs in as few modules as possible.
+
+    Duplicate objects (with equal signatures) are compiled once. The
+    unique objects are packed, in order, into modules of at most
+    ``max_module_objects`` objects each, and the modules are generated
+    and compiled concurrently.
+
+    Parameters
+    ----------
+    ufl_objects
+        List of UFL forms, UFL elements and (UFL expression, evaluation
+        points) pairs, in any order.
+    max_module_objects
+        Maximum number of unique objects per module.
+    max_workers
+        Maximum number of modules generated and compiled concurrently.
+
+    The remaining parameters are as for :func:`compile_forms`.
+
+    Returns
+    -------
+    List of compiled objects and list of the modules containing them,
+    both in the order of ``ufl_objects``. Forms and expressions are
+    compiled into UFC forms and expressions, elements into pairs of UFC
+    element and dofmap.
+
+    """
+    import ffcx.naming
+
+    p = ffcx.parameters.get_parameters(parameters)
+    tag = _compute_parameter_signature(p)
+
+    # Deduplicate by signature, keeping the order of first appearance
+    signatures = [ffcx.naming.compute_signature([obj], tag) for obj in ufl_objects]
+    unique_objects = {}
+    for signature, obj in zip(signatures, ufl_objects):
+        unique_objects.setdefault(signature, obj)
+
+    unique_signatures = list(unique_objects)
+    chunks = [unique_signatures[i:i + max_module_objects]
+              for i in range(0, len(unique_signatures), max_module_objects)]
+
+    def compile_chunk(chunk):
+        prefix = "libffcx_batch_" + hashlib.sha1(";".join(chunk).encode("utf-8")).hexdigest()
+        module_name = _module_name(prefix, cffi_extra_compile_args, cffi_debug)
+        objects = [unique_objects[s] for s in chunk]
+        decl, groups, object_names = _batch_module_contents(objects, prefix, p)
+        names = [name for names in object_names for name in names]
+        compiled, module, _ = _compile_module(decl, groups, names, module_name, p, cache_dir, timeout,
+                                              cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries,
+                                              cffi_jobs, cache_max_size, cache_max_age)
+        compiled = dict(zip(names, compiled))
+        return {s: (_pack_objects([compiled[name] for name in names]), module)
+                for s, names in zip(chunk, object_names)}
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for r in executor.map(compile_chunk, chunks):
+            results.update(r)
+
+    return [results[s][0] for s in signatures], [results[s][1] for s in signatures]
+
+
+@_signature_scope
+def build_bundle(ufl_objects, name, output_dir, parameters=None, cffi_extra_compile_args=None, cffi_verbose=False,
+                 cffi_debug=None, cffi_libraries=None, cffi_jobs=1):
+    """Compile forms, elements and (expression, points) pairs ahead of time into a kernel bundle.
+
+    A bundle is an extension module together with a manifest
+    ``<name>.ffcx-bundle.json``, which maps the signature of every object
+    to its symbol names. Once loaded with :func:`load_bundle` (or listed
+    in the environment variable ``FFCX_JIT_BUNDLES``), the JIT serves
+    requests for these objects from the bundle, without compiling, until
+    it is unloaded with :func:`unload_bundle` or :func:`clear_bundles`.
+
+    Parameters
+    ----------
+    ufl_objects
+        List of UFL forms, UFL elements and (UFL expression, evaluation
+        points) pairs.
+    name
+        Name of the bundle. Must be a valid C identifier.
+    output_dir
+        Directory to write the bundle to.
+
+    The remaining parameters are as for :func:`compile_forms`.
+
+    Returns
+    -------
+    Path of the manifest.
+
+    """
+    import ffcx.naming
+
+    p = ffcx.parameters.get_parameters(parameters)
+    tag = _compute_parameter_signature(p)
+
+    unique_objects = {}
+    for obj in ufl_objects:
+        unique_objects.setdefault(ffcx.naming.compute_signature([obj], tag), obj)
+
+    output_dir = Path(output_dir)
+    module_name = f"libffcx_bundle_{name}"
+    objects = list(unique_objects.values())
+    decl, groups, object_names = _batch_module_contents(objects, module_name, p)
+    symbols = [symbol for names in object_names for symbol in names]
+
+    # Remove results of a previous build, which would otherwise be reused
+    for filename in cache.module_files(output_dir, module_name):
+        filename.unlink()
+
+    with profiling.step("_compile_objects", "jit", {"module": module_name}):
+        _compile_objects(decl, groups, symbols, module_name, p, output_dir, cffi_extra_compile_args, cffi_verbose,
+                         cffi_debug, cffi_libraries, cffi_jobs, io.StringIO())
+
+    manifest = {"module": module_name,
+                "parameters": tag,
+                "objects": {signature: {"kind": _object_kind(obj), "names": names}
+                            for (signature, obj), names in zip(unique_objects.items(), object_names)}}
+    manifest_path = output_dir.joinpath(f"{name}.ffcx-bundle.json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+
+    return manifest_path
+
+
+def load_bundle(manifest_path):
+    """Serve JIT requests for the objects in a kernel bundle (see :func:`build_bundle`) from the bundle."""
+    manifest = _read_bundle(manifest_path)
+    with _registry_lock:
+        _bundles.append(manifest)
+
+
+def _read_bundle(manifest_path):
+    """Return the manifest of a kernel bundle, with its directory and not yet loaded."""
+    manifest_path = Path(manifest_path).absolute()
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest["directory"] = manifest_path.parent
+    manifest["loaded"] = None
+    return manifest
+
+
+def unload_bundle(manifest_path):
+    """Stop serving JIT requests from a kernel bundle loaded with :func:`load_bundle`."""
+    directory = Path(manifest_path).absolute().parent
+    with open(manifest_path) as f:
+        module = json.load(f)["module"]
+    with _registry_lock:
+        _bundles[:] = [bundle for bundle in _bundles
+                       if (bundle["directory"], bundle["module"]) != (directory, module)]
+
+
+def clear_bundles():
+    """Stop serving JIT requests from all loaded kernel bundles, including those in FFCX_JIT_BUNDLES."""
+    global _bundles_from_environment
+    with _registry_lock:
+        _bundles.clear()
+        _bundles_from_environment = True
+
+
+def _find_in_bundles(ufl_objects, parameters):
+    """Return compiled objects and module from a kernel bundle that contains all objects, or None."""
+    global _bundles_from_environment
+    with _registry_lock:
+        if not _bundles_from_environment:
+            _bundles_from_environment = True
+            _bundles.extend(_read_bundle(path) for path in os.environ.get("FFCX_JIT_BUNDLES", "").split(os.pathsep)
+                            if path)
+        bundles = list(_bundles)
+
+    if not bundles:
+        return None
+
+    import ffcx.naming
+    tag = _compute_parameter_signature(parameters)
+    signatures = [ffcx.naming.compute_signature([obj], tag) for obj in ufl_objects]
+    for bundle in bundles:
+        if bundle["parameters"] != tag or not all(s in bundle["objects"] for s in signatures):
+            continue
+        with _registry_lock:
+            if bundle["loaded"] is None:
+                names = [name for entry in bundle["objects"].values() for name in entry["names"]]
+                objects, module = _load_objects(bundle["directory"], bundle["module"], names)
+                bundle["loaded"] = (dict(zip(names, objects)), module)
+        compiled, module = bundle["loaded"]
+        _count("bundle_hits")
+        return [_pack_objects([compiled[name] for name in bundle["objects"][s]["names"]])
+                for s in signatures], module
+
+    return None
+
+
+def _batch_module_contents(ufl_objects, prefix, parameters):
+    """Return the declarations, groups and object names of a module of forms, elements and expressions.
+
+    Objects of each kind form a group, compiled with a prefix derived from
+    the given prefix. The object names are returned as a list of names
+    (two for elements, one otherwise) per object.
+    """
+    import ffcx.naming
+
+    decl = _module_declarations(parameters["scalar_type"], ("ELEMENT", "DOFMAP", "INTEGRAL", "FORM", "EXPRESSION"))
+    groups = []
+    object_names = [None] * len(ufl_objects)
+    for kind in ("form", "element", "expression"):
+        group = [i for i, obj in enumerate(ufl_objects) if _object_kind(obj) == kind]
+        if not group:
+            continue
+        group_prefix = f"{prefix}_{kind}s"
+        groups.append(([ufl_objects[i] for i in group], group_prefix))
+        for j, i in enumerate(group):
+            obj = ufl_objects[i]
+            if kind == "form":
+                object_names[i] = [ffcx.naming.form_name(obj, j, group_prefix)]
+                decl += f"extern ufc_form {object_names[i][0]};\n"
+            elif kind == "element":
+                element_prefix = ffcx.naming.element_prefix(group_prefix, parameters)
+                object_names[i] = [ffcx.naming.finite_element_name(obj, element_prefix),
+                                   ffcx.naming.dofmap_name(obj, element_prefix)]
+                decl += "extern ufc_finite_element {};\nextern ufc_dofmap {};\n".format(*object_names[i])
+            else:
+                object_names[i] = [ffcx.naming.expression_name(obj, group_prefix)]
+                decl += f"extern ufc_expression {object_names[i][0]};\n"
+
+    return decl, groups, object_names
+
+
+def _pack_objects(objects):
+    """Return the compiled object of a form or expression, or the (element, dofmap) pair of an element."""
+    return objects[0] if len(objects) == 1 else tuple(objects)
+
+
+def _get_executor():
+    """Return the worker pool of the asynchronous JIT API, creating it if needed."""
+    global _executor
+    with _registry_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="ffcx-jit")
+        return _executor
+
+
+def submit_elements(elements, **kwargs) -> concurrent.futures.Future:
+    """Compile elements in the background.
+
+    Returns a future for the result of :func:`compile_elements`, which is
+    called with the same arguments.
+    """
+    return _get_executor().submit(compile_elements, elements, **kwargs)
+
+
+def submit_forms(forms, **kwargs) -> concurrent.futures.Future:
+    """Compile forms in the background.
+
+    Returns a future for the result of :func:`compile_forms`, which is
+    called with the same arguments.
+    """
+    return _get_executor().submit(compile_forms, forms, **kwargs)
+
+
+def submit_expressions(expressions, **kwargs) -> concurrent.futures.Future:
+    """Compile expressions in the background.
+
+    Returns a future for the result of :func:`compile_expressions`, which
+    is called with the same arguments.
+    """
+    return _get_executor().submit(compile_expressions, expressions, **kwargs)
+
+
+async def compile_elements_async(elements, **kwargs):
+    """Compile elements without blocking the asyncio event loop (see :func:`compile_elements`)."""
+    return await asyncio.wrap_future(submit_elements(elements, **kwargs))
+
+
+async def compile_forms_async(forms, **kwargs):
+    """Compile forms without blocking the asyncio event loop (see :func:`compile_forms`)."""
+    return await asyncio.wrap_future(submit_forms(forms, **kwargs))
+
+
+async def compile_expressions_async(expressions, **kwargs):
+    """Compile expressions without blocking the asyncio event loop (see :func:`compile_expressions`)."""
+    return await asyncio.wrap_future(submit_expressions(expressions, **kwargs))
+
+
+class TieredModule:
+    """Compiled objects of a tiered JIT compilation.
+
+    Objects from a quick, low-optimisation build are available
+    immediately, while an optimised build runs in the background.
+    :attr:`objects` and :attr:`module` return the optimised build once it
+    has finished successfully, and the quick build until then.
+    """
+
+    def __init__(self, fast, future):
+        self.fast = fast
+        self.future = future
+
+    def optimized_ready(self) -> bool:
+        """Return True if the optimised build has finished successfully."""
+        return self.future.done() and self.future.exception() is None
+
+    def wait(self, timeout=None):
+        """Wait for the optimised build and return its (objects, module, code)."""
+        return self.future.result(timeout)
+
+    @property
+    def objects(self):
+        return self.future.result()[0] if self.optimized_ready() else self.fast[0]
+
+    @property
+    def module(self):
+        return self.future.result()[1] if self.optimized_ready() else self.fast[1]
+
+
+def compile_forms_tiered(forms, fast_compile_args=("-O0",), **kwargs) -> TieredModule:
+    """Compile forms quickly with low optimisation, and with full optimisation in the background.
+
+    Parameters
+    ----------
+    forms
+        List of UFL forms.
+    fast_compile_args
+        Compiler arguments of the quick build. Optimisation flags in
+        ``cffi_extra_compile_args`` are replaced by these for the quick
+        build, other flags are kept.
+
+    The remaining parameters are as for :func:`compile_forms` and apply to
+    the optimised build. As the compiler arguments differ, the two builds
+    are cached as distinct modules. The code is only generated once, by
+    the quick build: the optimised build starts once it has been
+    generated, and takes it from the code cache.
+
+    """
+    return _compile_tiered(compile_forms, forms, fast_compile_args, kwargs)
+
+
+def compile_expressions_tiered(expressions, fast_compile_args=("-O0",), **kwargs) -> TieredModule:
+    """Compile expressions quickly with low optimisation, and with full optimisation in the background.
+
+    See :func:`compile_forms_tiered`.
+    """
+    return _compile_tiered(compile_expressions, expressions, fast_compile_args, kwargs)
+
+
+def _compile_tiered(compile_function, ufl_objects, fast_compile_args, kwargs):
+    # The optimised build starts once the quick build has generated the
+    # code, which it then takes from the code cache, so that the code is
+    # generated once and only the C compilations overlap
+    generated = threading.Event()
+
+    def compile_optimized():
+        generated.wait()
+        return compile_function(ufl_objects, **kwargs)
+
+    future = _get_executor().submit(compile_optimized)
+
+    compile_args = kwargs.get("cffi_extra_compile_args") or []
+    fast_kwargs = dict(kwargs)
+    fast_kwargs["cffi_extra_compile_args"] = [arg for arg in compile_args if not arg.startswith("-O")] \
+        + list(fast_compile_args)
+    token = _code_generated.set(generated)
+    try:
+        fast = compile_function(ufl_objects, **fast_kwargs)
+    finally:
+        # Also if the quick build was found compiled, or failed
+        _code_generated.reset(token)
+        generated.set()
+
+    return TieredModule(fast, future)
+
+
+def _object_kind(ufl_object):
+    """Return the kind ("form", "element" or "expression") of a UFL object to compile."""
+    import ufl
+
+    if isinstance(ufl_object, ufl.Form):
+        return "form"
+    elif isinstance(ufl_object, ufl.FiniteElementBase):
+        return "element"
+    elif isinstance(ufl_object, tuple) and isinstance(ufl_object[0], ufl.core.expr.Expr):
+        return "expression"
+    else:
+        raise RuntimeError(f"Unknown ufl object type {ufl_object.__class__.__name__}")
+
+
+def _compile_module(decl, groups, object_names, module_name, parameters, cache_dir, timeout,
+                    cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries,
+                    cffi_jobs, cache_max_size, cache_max_age, comm=None):
+    """Return a module from the in-process registry or the cache directory, or compile it.
+
+    The module contains the code generated for each (UFL objects, prefix)
+    pair in groups. Without a cache directory, the per-process scratch
+    directory is used. Concurrent calls for the same module within a process wait for a
+    single compilation. Failed compilations are recorded in the cache and
+    replayed on subsequent calls.
+    """
+    if comm is not None:
+        return _compile_module_collective(comm, decl, groups, object_names, module_name, parameters, cache_dir,
+                                          timeout, cffi_extra_compile_args, cffi_verbose, cffi_debug,
+                                          cffi_libraries, cffi_jobs, cache_max_size, cache_max_age)
+
+    if cache_dir is None:
+        cache_dir = cache.scratch_dir()
+        shared = False
     else:
-        cache_dir = Path(tempfile.mkdtemp())
+        cache_dir = Path(cache_dir)
+        shared = True
 
+    key = (str(cache_dir.absolute()), module_name)
     try:
-        decl = UFC_HEADER_DECL.format(p["scalar_type"]) + UFC_ELEMENT_DECL + UFC_DOFMAP_DECL + \
-            UFC_INTEGRAL_DECL + UFC_FORM_DECL + UFC_EXPRESSION_DECL
-
-        expression_template = "extern ufc_expression {name};\n"
-        for name in expr_names:
-            decl += expression_template.format(name=name)
-
-        impl = _compile_objects(decl, expressions, expr_names, module_name, p, cache_dir,
-                                cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries)
-    except Exception:
-        # remove c file so that it will not timeout next time
-        c_filename = cache_dir.joinpath(module_name + ".c")
-        os.replace(c_filename, c_filename.with_suffix(".c.failed"))
-        raise
-
-    obj, module = _load_objects(cache_dir, module_name, expr_names)
+        obj, module = _modules[key]
+        _count("memory_hits")
+        return obj, module, (None, None)
+    except KeyError:
+        pass
+
+    module_lock = _module_lock(key)
+    if module_lock.locked():
+        _count("waits")
+    with module_lock:
+        # Another thread may have finished the module while we waited
+        # for the lock
+        if key in _modules:
+            obj, module = _modules[key]
+            _count("memory_hits")
+            return obj, module, (None, None)
+
+        obj, module, lock = get_cached_module(module_name, object_names, cache_dir, timeout)
+        if obj is not None:
+            if shared:
+                cache.touch(cache_dir, module_name)
+            _modules[key] = (obj, module)
+            return obj, module, (None, None)
+
+        _count("misses")
+        log = io.StringIO()
+        try:
+            with profiling.step("_compile_objects", "jit", {"module": module_name}):
+                impl = _compile_objects(decl, groups, object_names, module_name, parameters, cache_dir,
+                                        cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries,
+                                        cffi_jobs, log, code_cache_dir=cache_dir)
+        except OSError:
+            # Possibly transient (e.g. a full disk), so do not record a failure
+            raise
+        except Exception as e:
+            _count("failures")
+            # Keep failed c file for inspection
+            c_filename = cache_dir.joinpath(module_name + ".c")
+            if c_filename.exists():
+                os.replace(c_filename, c_filename.with_suffix(".c.failed"))
+            error = "".join(traceback.format_exception_only(type(e), e))
+            cache.record_failure(cache_dir, module_name, error, log.getvalue(),
+                                 _compute_parameter_signature(parameters) + str(cffi_extra_compile_args)
+                                 + str(cffi_debug))
+            if shared:
+                cache.record(cache_dir, module_name, status="failed")
+            raise
+        finally:
+            # Closing the lock file releases the lock, waking up waiting processes
+            lock.close()
+
+        obj, module = _load_objects(cache_dir, module_name, object_names)
+        _modules[key] = (obj, module)
+
+    _add_bytes_written(sum(f.stat().st_size for f in cache.module_files(cache_dir, module_name) if f.exists()))
+    if shared:
+        cache.record(cache_dir, module_name)
+        if cache_max_size is not None or cache_max_age is not None:
+            cache.evict(cache_dir, cache_max_size, cache_max_age, keep=(module_name,))
+        _set_cache_size(cache_dir, cache.size(cache_dir))
+
     return obj, module, (decl, impl)
 
 
-def _compile_objects(decl, ufl_objects, object_names, module_name, parameters, cache_dir,
-                     cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries):
+def _compile_module_collective(comm, decl, groups, object_names, module_name, parameters, cache_dir, timeout,
+                               cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries, cffi_jobs,
+                               cache_max_size, cache_max_age):
+    """Compile a module on rank 0 of a communicator and load it on all ranks.
 
-    import ffcx.compiler
+    Only rank 0 touches the cache directory. The other ranks wait in the
+    broadcast of the location of the module (or of the error) and load
+    it from a node-local copy, so that they neither poll the cache
+    directory nor load the module from a network file system.
+    """
+    if cache_dir is None:
+        # The scratch directory of rank 0 is private to its process
+        raise ValueError("A cache directory shared by all ranks is required with a communicator.")
 
-    # JIT uses module_name as prefix, which is needed to make names of all struct/function
-    # unique across modules
-    _, code_body = ffcx.compiler.compile_ufl_objects(ufl_objects, prefix=module_name, parameters=parameters)
+    if comm.rank == 0:
+        try:
+            result = _compile_module(decl, groups, object_names, module_name, parameters, cache_dir, timeout,
+                                     cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries,
+                                     cffi_jobs, cache_max_size, cache_max_age)
+        except Exception as e:
+            comm.bcast(("".join(traceback.format_exception_only(type(e), e)), None), root=0)
+            raise
+        comm.bcast((None, result[1].__file__), root=0)
+        return result
 
-    ffibuilder = cffi.FFI()
-    ffibuilder.set_source(module_name, code_body, include_dirs=[ffcx.codegeneration.get_include_path()],
-                          extra_compile_args=cffi_extra_compile_args, libraries=cffi_libraries)
-    ffibuilder.cdef(decl)
+    error, filename = comm.bcast(None, root=0)
+    if error is not None:
+        raise RuntimeError(f"JIT compilation of {module_name} failed on rank 0 with:\n{error}")
 
-    c_filename = cache_dir.joinpath(module_name + ".c")
-    ready_name = c_filename.with_suffix(".c.cached")
+    staged = cache.stage(filename) if cache_max_age is None else cache.stage(filename, cache_max_age)
+    key = (str(staged.parent), module_name)
+    with _module_lock(key):
+        if key in _modules:
+            _count("memory_hits")
+        else:
+            _count("disk_hits")
+            _modules[key] = _load_objects(staged.parent, module_name, object_names)
+        obj, module = _modules[key]
+    return obj, module, (None, None)
+
+
+def _compile_objects(decl, groups, object_names, module_name, parameters, cache_dir,
+                     cffi_extra_compile_args, cffi_verbose, cffi_debug, cffi_libraries, cffi_jobs, log,
+                     code_cache_dir=None):
+
+    import cffi
+    import ffcx.compiler
 
-    # Compile (ensuring that compile dir exists)
+    # Ensure that compile dir exists
     cache_dir.mkdir(exist_ok=True, parents=True)
 
+    # JIT uses a prefix derived from the signature of the objects, which is needed to make
+    # names of all struct/function unique across modules. Modules that differ in compiler
+    # flags only share names, which is harmless as extension modules do not export symbols
+    # globally. Several groups of objects are generated concurrently.
+    split = cffi_jobs > 1
+
+    def generate(group):
+        i, (ufl_objects, prefix) = group
+        timings = {}
+        with profiling.step("generate", "jit", {"prefix": prefix}):
+            code = ffcx.compiler.compile_ufl_objects(ufl_objects, prefix=prefix, parameters=parameters, split=split,
+                                                     header_name=f"{module_name}.{i}.h", timings=timings,
+                                                     cache_dir=code_cache_dir)
+        _add_times(timings)
+        return code
+
+    if len(groups) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            codes = list(executor.map(generate, enumerate(groups)))
+    else:
+        codes = [generate((0, groups[0]))]
+
+    generated = _code_generated.get()
+    if generated is not None:
+        generated.set()
+
     logger.info(79 * "#")
     logger.info("Calling JIT C compiler")
     logger.info(79 * "#")
 
     t0 = time.time()
-    f = io.StringIO()
-    with redirect_stdout(f):
-        ffibuilder.compile(tmpdir=cache_dir, verbose=True, debug=cffi_debug)
-    s = f.getvalue()
-    if (cffi_verbose):
-        print(s)
+    include_dirs = [ffcx.codegeneration.get_include_path()]
+    extra_objects = []
+    if split:
+        units = []
+        for i, (code_h, code_c) in enumerate(codes):
+            cache_dir.joinpath(f"{module_name}.{i}.h").write_text(code_h)
+            units += code_c
+        include_dirs.append(str(cache_dir))
+        impl = "".join(source for _, source in units)
+        if len(units) > 1:
+            # Compile each translation unit to an object file in parallel,
+            # and link them into the extension module, whose own source
+            # only includes the headers
+            extra_objects = _compile_translation_units(units, module_name, cache_dir, include_dirs,
+                                                       cffi_extra_compile_args, cffi_debug, cffi_jobs)
+            code_body = "".join(f'#include "{module_name}.{i}.h"\n' for i in range(len(codes)))
+        else:
+            code_body = impl
+    else:
+        code_body = "".join(code_c for _, code_c in codes)
+        impl = code_body
+
+    t1 = time.time()
+    with profiling.step("cffi cdef", "jit"):
+        ffibuilder = cffi.FFI()
+        ffibuilder.set_source(module_name, code_body, include_dirs=include_dirs,
+                              extra_compile_args=cffi_extra_compile_args, libraries=cffi_libraries,
+                              extra_objects=extra_objects)
+        ffibuilder.cdef(decl)
+    t_source = time.time() - t1
 
-    logger.info("JIT C compiler finished in {:.4f}".format(time.time() - t0))
+    c_filename = cache_dir.joinpath(module_name + ".c")
+    ready_name = c_filename.with_suffix(".c.cached")
+
+    try:
+        with redirect_stdout(log), profiling.step("cffi compile", "jit", {"module": module_name}):
+            ffibuilder.compile(tmpdir=cache_dir, verbose=True, debug=cffi_debug)
+    finally:
+        s = log.getvalue()
+        if (cffi_verbose):
+            print(s)
+
+    t_compile = time.time() - t0
+    _add_times({"cffi_source": t_source, "c_compile": t_compile - t_source})
+    logger.info("JIT C compiler finished in {:.4f}".format(t_compile))
 
     # Create a "status ready" file. If this fails, it is an error,
     # because it should not exist yet.
@@ -261,11 +1100,44 @@ def _compile_objects(decl, ufl_objects, object_names, module_name, parameters, c
     fd.write(s)
     fd.close()
 
-    return code_body
+    return impl
+
+
+def _compile_translation_units(units, module_name, cache_dir, include_dirs, cffi_extra_compile_args, cffi_debug,
+                               cffi_jobs):
+    """Compile translation units to object files, running up to cffi_jobs compilers concurrently.
+
+    The compilers are those of distutils, which cffi builds modules with,
+    and which setuptools provides from Python 3.12.
+    """
+    import setuptools  # noqa: F401
+    from distutils.ccompiler import new_compiler
+    from distutils.sysconfig import customize_compiler
+
+    def compile_unit(unit):
+        i, (name, source) = unit
+        c_filename = cache_dir.joinpath(f"{module_name}.{i}.c")
+        c_filename.write_text(source)
+
+        # Create a compiler per unit, as compiler objects are not thread safe
+        compiler = new_compiler()
+        customize_compiler(compiler)
+
+        # Object files are placed beside their sources (the absolute source
+        # path is appended to output_dir)
+        with profiling.step("compile translation unit", "jit", {"name": name}):
+            objects = compiler.compile([str(c_filename)], output_dir=os.sep, include_dirs=include_dirs,
+                                       extra_postargs=cffi_extra_compile_args, debug=cffi_debug)
+        return objects[0]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=cffi_jobs) as executor:
+        return list(executor.map(compile_unit, enumerate(units)))
 
 
 def _load_objects(cache_dir, module_name, object_names):
 
+    t0 = time.time()
+
     # Create module finder that searches the compile path
     finder = importlib.machinery.FileFinder(
         str(cache_dir), (importlib.machinery.ExtensionFileLoader, importlib.machinery.EXTENSION_SUFFIXES))
@@ -278,12 +1150,14 @@ def _load_objects(cache_dir, module_name, object_names):
         raise ModuleNotFoundError("Unable to find JIT module.")
 
     # Load module
-    compiled_module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(compiled_module)
+    with profiling.step("load module", "jit", {"module": module_name}):
+        compiled_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(compiled_module)
 
     compiled_objects = []
     for name in object_names:
         obj = getattr(compiled_module.lib, name)
         compiled_objects.append(obj)
 
+    _add_times({"module_load": time.time() - t0})
     return compiled_objects, compiled_module
@@ -67,10 +67,18 @@ import logging
 import typing
 from time import time
 
+import ffcx.naming
+import ufl
+from ffcx import __version__ as FFCX_VERSION
+from ffcx import profiling
 from ffcx.analysis import analyze_ufl_objects
-from ffcx.codegeneration.codegeneration import generate_code
-from ffcx.formatting import format_code
-from ffcx.ir.representation import compute_ir
+from ffcx.codegeneration import cache, get_signature
+from ffcx.codegeneration.codegeneration import (code_blocks, content_address_integrals,
+                                                content_addressed_integral, generate_code,
+                                                generate_object_code, rename_references)
+from ffcx.formatting import format_code, format_code_split, write_code_stream
+from ffcx.ir.representation import compute_ir, iter_ir
+from ffcx.parameters import EXECUTION_PARAMETERS, FFCX_DEFAULT_PARAMETERS
 
 logger = logging.getLogger("ffcx")
 
@@ -80,37 +88,209 @@ def _print_timing(stage, timing):
         stage=stage, time=timing))
 
 
+def _record_timing(stage, key, timing, timings):
+    _print_timing(stage, timing)
+    if timings is not None:
+        timings[key] = timings.get(key, 0.0) + timing
+
+
+@ffcx.naming.signature_scope()
 def compile_ufl_objects(ufl_objects: typing.Union[typing.List, typing.Tuple],
                         object_names: typing.Dict = {},
                         prefix: str = None,
                         parameters: typing.Dict = None,
-                        visualise: bool = False):
+                        visualise: bool = False,
+                        split: bool = False,
+                        header_name: str = None,
+                        timings: typing.Dict = None,
+                        cache_dir: str = None,
+                        profile: bool = False):
     """Generate UFC code for a given UFL objects.
 
     Parameters
     ----------
     @param ufl_objects:
         Objects to be compiled. Accepts elements, forms, integrals or coordinate mappings.
+    @param split:
+        If True, return one source file per element, dofmap, integral,
+        form and expression (as a list of (name, source) pairs) instead
+        of a single source file.
+    @param header_name:
+        Name under which the source files include the header when split
+        (default "<prefix>.h").
+    @param timings:
+        If given, the time (in seconds) spent in each stage is added to
+        this dictionary under the keys "analysis", "ir", "codegen" and
+        "formatting".
+    @param cache_dir:
+        If given, the generated code is stored in this directory, and
+        taken from there when the same objects are compiled again with
+        the same names, prefix and parameters. Only the formatting stage
+        is then run.
+    @param profile:
+        If True, also return a :class:`ffcx.profiling.Report` with the wall
+        time and peak memory of every stage, and of every form, integral,
+        element, dofmap and expression in each stage.
+
+    """
+    if profile:
+        with profiling.profile() as report:
+            code_h, code_c = compile_ufl_objects(ufl_objects, object_names, prefix, parameters, visualise, split,
+                                                 header_name, timings, cache_dir)
+        return code_h, code_c, report
+
+    key = None
+    if cache_dir is not None and not visualise:
+        key = _code_cache_key(ufl_objects, object_names, prefix, parameters)
+        cached = cache.load_code(cache_dir, key)
+    if key is not None and cached is not None:
+        logger.info(f"Generated code found in cache {cache_dir}")
+        code, names = code_blocks(*cached[0]), code_blocks(*cached[1])
+    else:
+        code, names = _generate_code(ufl_objects, object_names, prefix, parameters, visualise, timings)
+        if key is not None:
+            cache.store_code(cache_dir, key, code, names)
+
+    # Stage 4: format code
+    cpu_time = time()
+    with profiling.span("stage", "formatting"):
+        if split:
+            code_h, code_c = format_code_split(code, names, header_name or f"{prefix}.h", parameters)
+        else:
+            code_h, code_c = format_code(code, parameters)
+    _record_timing(4, "formatting", time() - cpu_time, timings)
+
+    return code_h, code_c
+
+
+@ffcx.naming.signature_scope()
+def stream_ufl_objects(ufl_objects: typing.Union[typing.List, typing.Tuple],
+                       file_h: typing.TextIO,
+                       file_c: typing.TextIO,
+                       object_names: typing.Dict = {},
+                       prefix: str = None,
+                       parameters: typing.Dict = None,
+                       visualise: bool = False,
+                       timings: typing.Dict = None):
+    """Generate UFC code for given UFL objects one object at a time, writing it to open files.
+
+    Every integral (and every other object) is taken through the
+    stages 2-4 and written before the next one is started, and its
+    preprocessed integrand, IR and code are released. Peak memory thus
+    depends on the largest integral rather than on the number of
+    integrals. The analysis of all objects is still done first, and the
+    integrals are computed serially whatever the parameter "workers".
+
+    Parameters
+    ----------
+    @param file_h:
+        Text file to which the header is written.
+    @param file_c:
+        Text file to which the source is written.
+    @param timings:
+        As for :func:`compile_ufl_objects`.
+
+    The files get the same contents as the strings returned by
+    :func:`compile_ufl_objects`.
 
     """
+    stage_timings = {}
+    cpu_time = time()
+    write_code_stream(_stream_code(ufl_objects, object_names, prefix, parameters, visualise, stage_timings),
+                      file_h, file_c, parameters)
+    _record_timing(4, "formatting", time() - cpu_time - sum(stage_timings.values()), timings)
+    if timings is not None:
+        for key, timing in stage_timings.items():
+            timings[key] = timings.get(key, 0.0) + timing
+
+
+def _stream_code(ufl_objects, object_names, prefix, parameters, visualise, timings):
+    """Run the compiler stages 1-3, yielding the code of one object at a time."""
+    # Stage 1: analysis
+    cpu_time = time()
+    with profiling.span("stage", "analysis"):
+        analysis = analyze_ufl_objects(ufl_objects, parameters, prefix)
+    _record_timing(1, "analysis", time() - cpu_time, timings)
+
+    # Stages 2 and 3, object by object. The integrals come before the
+    # forms, which refer to their content-addressed names.
+    content_addressed = parameters["content_addressed_names"]
+    renames = {}
+    ir_time = codegen_time = 0.0
+    irs = iter_ir(analysis, object_names, prefix, parameters, visualise)
+    while True:
+        cpu_time = time()
+        with profiling.span("stage", "ir"):
+            field_ir = next(irs, None)
+        ir_time += time() - cpu_time
+        if field_ir is None:
+            break
+
+        cpu_time = time()
+        with profiling.span("stage", "codegen"):
+            code = generate_object_code(*field_ir, parameters)
+            field, ir = field_ir
+            if content_addressed and field == "integrals":
+                name, code = content_addressed_integral(ir.name, code)
+                if name in renames.values():
+                    code = None
+                renames[ir.name] = name
+            elif content_addressed and field == "forms":
+                code = rename_references(code, renames)
+        codegen_time += time() - cpu_time
+
+        del field_ir, ir
+        if code is None:
+            # The same integral was already written
+            continue
+        yield code
+        del code
+
+    _record_timing(2, "ir", ir_time, timings)
+    _record_timing(3, "codegen", codegen_time, timings)
+
+
+def _generate_code(ufl_objects, object_names, prefix, parameters, visualise, timings):
+    """Run the compiler stages 1-3, returning the code blocks and the names of the generated objects."""
     # Stage 1: analysis
     cpu_time = time()
-    analysis = analyze_ufl_objects(ufl_objects, parameters)
-    _print_timing(1, time() - cpu_time)
+    with profiling.span("stage", "analysis"):
+        analysis = analyze_ufl_objects(ufl_objects, parameters, prefix)
+    _record_timing(1, "analysis", time() - cpu_time, timings)
 
     # Stage 2: intermediate representation
     cpu_time = time()
-    ir = compute_ir(analysis, object_names, prefix, parameters, visualise)
-    _print_timing(2, time() - cpu_time)
+    with profiling.span("stage", "ir"):
+        ir = compute_ir(analysis, object_names, prefix, parameters, visualise)
+    _record_timing(2, "ir", time() - cpu_time, timings)
 
     # Stage 3: code generation
     cpu_time = time()
-    code = generate_code(ir, parameters)
-    _print_timing(3, time() - cpu_time)
+    with profiling.span("stage", "codegen"):
+        code = generate_code(ir, parameters)
+    _record_timing(3, "codegen", time() - cpu_time, timings)
 
-    # Stage 4: format code
-    cpu_time = time()
-    code_h, code_c = format_code(code, parameters)
-    _print_timing(4, time() - cpu_time)
+    names = code_blocks(*([obj.name for obj in objs] for objs in ir))
+    if parameters["content_addressed_names"]:
+        code, names = content_address_integrals(code, names)
+    return code, names
 
-    return code_h, code_c
+
+def _code_cache_key(ufl_objects, object_names, prefix, parameters):
+    """Return the key of the generated code in the cache.
+
+    The key covers everything that the compiler stages 1-3 depend on:
+    the objects, the names given to them and to the arguments,
+    coefficients and constants of forms, the prefix, the FFCx parameters
+    and the versions of FFCx and UFC.
+    """
+    names = []
+    for obj in ufl_objects:
+        names.append(object_names.get(id(obj)))
+        if isinstance(obj, ufl.Form):
+            names += [object_names.get(id(f)) for f in obj.arguments() + obj.coefficients() + obj.constants()]
+
+    ffcx_parameters = sorted((k, v) for k, v in parameters.items()
+                             if k in FFCX_DEFAULT_PARAMETERS and k not in EXECUTION_PARAMETERS)
+    tag = f"{ffcx_parameters}{names}{prefix}{FFCX_VERSION}{get_signature()}"
+    return ffcx.naming.compute_signature(ufl_objects, tag)
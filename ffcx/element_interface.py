@@ -1,11 +1,17 @@
+import functools
 import numpy
 import ufl
 import basix
 import warnings
 
 
+@functools.lru_cache(maxsize=None)
 def create_element(ufl_element):
-    """Create an element from a UFL element."""
+    """Create an element from a UFL element.
+
+    Elements are cached, so that they are only created once per process
+    (e.g. for all forms compiled by a compile server).
+    """
     # TODO: EnrichedElement
     # TODO: Short/alternative names for elements
     # TODO: Allow different args for different parts of mixed element
@@ -56,13 +62,20 @@ def basix_index(*args):
     return basix.index(*args)
 
 
+@functools.lru_cache(maxsize=None)
 def create_quadrature(cellname, degree, rule):
-    """Create a quadrature rule."""
+    """Create a quadrature rule.
+
+    Quadrature rules are cached, and their points and weights are thus
+    read-only arrays.
+    """
     if cellname == "vertex":
         return [[]], [1]
 
     quadrature = basix.make_quadrature(
         basix.quadrature.string_to_type(rule), basix.cell.string_to_type(cellname), degree)
+    for array in quadrature:
+        array.setflags(write=False)
 
     # The quadrature degree from UFL can be very high for some
     # integrals.  Print warning if number of quadrature points
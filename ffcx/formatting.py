@@ -13,6 +13,7 @@ ufc_utils.
 
 """
 
+import contextlib
 import logging
 import os
 import pprint
@@ -21,6 +22,7 @@ from collections import namedtuple
 
 from ffcx import __version__ as FFCX_VERSION
 from ffcx.codegeneration import __version__ as UFC_VERSION
+from ffcx.parameters import EXECUTION_PARAMETERS, FFCX_DEFAULT_PARAMETERS
 
 logger = logging.getLogger("ffcx")
 
@@ -43,6 +45,24 @@ FORMAT_TEMPLATE = {
 """,
     "header_c":
     """
+""",
+    "cmake":
+    """\
+# Generated by FFCx version {ffcx_version}. Sources of {prefix}.h, to be
+# compiled with the UFC header (ffcx.codegeneration.get_include_path()).
+set({prefix}_HEADERS ${{CMAKE_CURRENT_LIST_DIR}}/{prefix}.h)
+set({prefix}_SOURCES
+{sources})
+set({prefix}_INCLUDE_DIRS ${{CMAKE_CURRENT_LIST_DIR}})
+""",
+    "make":
+    """\
+# Generated by FFCx version {ffcx_version}. Sources of {prefix}.h, to be
+# compiled with the UFC header (ffcx.codegeneration.get_include_path()).
+{prefix}_DIR := $(dir $(lastword $(MAKEFILE_LIST)))
+{prefix}_HEADERS := $({prefix}_DIR){prefix}.h
+{prefix}_SOURCES := \\
+{sources}
 """,
 }
 
@@ -65,21 +85,7 @@ def format_code(code: namedtuple, parameters):
     logger.info("Compiler stage 5: Formatting code")
     logger.info(79 * "*")
 
-    # Generate code for comment at top of file
-    code_h_pre = _generate_comment(parameters) + "\n"
-    code_c_pre = _generate_comment(parameters) + "\n"
-
-    # Generate code for header
-    code_h_pre += FORMAT_TEMPLATE["header_h"]
-    code_c_pre += FORMAT_TEMPLATE["header_c"]
-
-    # Generate includes and add to preamble
-    includes_h, includes_c = _generate_includes(parameters)
-    code_h_pre += includes_h
-    code_c_pre += includes_c
-
-    # Enclose header with 'extern "C"'
-    code_h_pre += c_extern_pre
+    code_h_pre, code_c_pre = _generate_preamble(parameters)
     code_h_post = c_extern_post
 
     code_h = ""
@@ -96,18 +102,172 @@ def format_code(code: namedtuple, parameters):
     return code_h, code_c
 
 
+def format_code_split(code: namedtuple, names: namedtuple, header_name: str, parameters):
+    """Format given code in UFC format, with one source file per element, dofmap, integral, form and expression.
+
+    The source files include the header, so that they can be compiled
+    independently of each other. With the parameter
+    "content_addressed_names", the source files of integrals do not,
+    as they declare what they refer to, and their comment only lists
+    the FFCx parameters (and not e.g. the options of the command-line
+    interface), so that they only change with the integral itself.
+
+    Parameters
+    ----------
+    code
+        Code blocks.
+    names
+        Names of the objects in the code blocks, in the same layout.
+    header_name
+        File name under which the header will be included.
+
+    Returns
+    -------
+    The header file contents and a list of (name, source file contents).
+
+    """
+    logger.info(79 * "*")
+    logger.info("Compiler stage 5: Formatting code")
+    logger.info(79 * "*")
+
+    code_h_pre, code_c_pre = _generate_preamble(parameters)
+    code_c_pre += f'#include "{header_name}"\n'
+    ffcx_parameters = {k: v for k, v in parameters.items() if k in FFCX_DEFAULT_PARAMETERS}
+    _, integral_c_pre = _generate_preamble(ffcx_parameters)
+
+    code_h = ""
+    units = []
+    for field, parts_code, parts_names in zip(code._fields, code, names):
+        code_h += "".join([c[0] for c in parts_code])
+        pre = code_c_pre
+        if field == "integrals" and parameters["content_addressed_names"]:
+            pre = integral_c_pre
+        units += [(name, pre + c[1]) for c, name in zip(parts_code, parts_names)]
+
+    code_h = code_h_pre + code_h + c_extern_post
+
+    return code_h, units
+
+
+def write_code_stream(code, file_h, file_c, parameters):
+    """Format code in UFC format, writing it to open header and source files as it comes.
+
+    Parameters
+    ----------
+    code : iterable
+        Pairs (declaration, implementation) of every object, in the
+        order of the code blocks, e.g. generated one object at a time.
+    file_h, file_c : file
+        Text files to which the header and source are written. They
+        get the same contents as the strings returned by
+        :func:`format_code`.
+
+    """
+    logger.info(79 * "*")
+    logger.info("Compiler stage 5: Formatting code (streaming)")
+    logger.info(79 * "*")
+
+    code_h_pre, code_c_pre = _generate_preamble(parameters)
+    file_h.write(code_h_pre)
+    file_c.write(code_c_pre)
+    for code_h, code_c in code:
+        file_h.write(code_h)
+        file_c.write(code_c)
+    file_h.write(c_extern_post)
+
+
 def write_code(code_h, code_c, prefix, output_dir):
     _write_file(code_h, prefix, ".h", output_dir)
     _write_file(code_c, prefix, ".c", output_dir)
 
 
+def write_code_split(code_h, units, prefix, output_dir):
+    """Write the header and source files returned by :func:`format_code_split`, and build fragments listing them.
+
+    Every source file is named after its object, ``<prefix>_<name>.c``.
+    The CMake fragment ``<prefix>.cmake`` and the Makefile fragment
+    ``<prefix>.mk`` set the variables ``<prefix>_HEADERS``,
+    ``<prefix>_SOURCES`` and ``<prefix>_INCLUDE_DIRS`` (CMake) or
+    ``<prefix>_DIR`` (make), so that a build includes the fragment and
+    compiles the source files concurrently. Unchanged files are left
+    untouched, so that only the objects that changed are compiled again.
+
+    Returns the names of the written files.
+    """
+    sources = [f"{prefix}_{name}.c" for name, _ in units]
+    _write_file(code_h, prefix, ".h", output_dir)
+    for source, (_, code_c) in zip(sources, units):
+        with open_output(os.path.join(output_dir, source)) as f:
+            f.write(code_c)
+
+    cmake = FORMAT_TEMPLATE["cmake"].format(
+        ffcx_version=FFCX_VERSION, prefix=prefix,
+        sources="".join(f"    ${{CMAKE_CURRENT_LIST_DIR}}/{source}\n" for source in sources).rstrip("\n"))
+    _write_file(cmake, prefix, ".cmake", output_dir)
+    make = FORMAT_TEMPLATE["make"].format(
+        ffcx_version=FFCX_VERSION, prefix=prefix,
+        sources=" \\\n".join(f"    $({prefix}_DIR){source}" for source in sources))
+    _write_file(make, prefix, ".mk", output_dir)
+
+    return [f"{prefix}.h", *sources, f"{prefix}.cmake", f"{prefix}.mk"]
+
+
 def _write_file(output, prefix, postfix, output_dir):
     """Write generated code to file."""
     filename = os.path.join(output_dir, prefix + postfix)
-    with open(filename, "w") as hfile:
+    with open_output(filename) as hfile:
         hfile.write(output)
 
 
+@contextlib.contextmanager
+def open_output(filename):
+    """Open a file for writing generated code, leaving the file (and its time stamp) untouched if unchanged.
+
+    The code is written to a temporary file, which replaces the file on
+    exit if the contents differ, so that e.g. make does not rebuild
+    what depends on code that was generated again but did not change.
+    """
+    tmp = f"{filename}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            yield f
+        if os.path.isfile(filename) and _read_bytes(tmp) == _read_bytes(filename):
+            logger.info(f"{filename} is unchanged")
+            os.remove(tmp)
+        else:
+            os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _read_bytes(filename):
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+def _generate_preamble(parameters):
+    """Generate code for the top of the header and source files."""
+    # Generate code for comment at top of file
+    code_h_pre = _generate_comment(parameters) + "\n"
+    code_c_pre = _generate_comment(parameters) + "\n"
+
+    # Generate code for header
+    code_h_pre += FORMAT_TEMPLATE["header_h"]
+    code_c_pre += FORMAT_TEMPLATE["header_c"]
+
+    # Generate includes and add to preamble
+    includes_h, includes_c = _generate_includes(parameters)
+    code_h_pre += includes_h
+    code_c_pre += includes_c
+
+    # Enclose header with 'extern "C"'
+    code_h_pre += c_extern_pre
+
+    return code_h_pre, code_c_pre
+
+
 def _generate_comment(parameters):
     """Generate code for comment on top of file."""
     # Generate top level comment
@@ -117,6 +277,7 @@ def _generate_comment(parameters):
     comment += "//\n"
     comment += "// This code was generated with the following parameters:\n"
     comment += "//\n"
+    parameters = {k: v for k, v in parameters.items() if k not in EXECUTION_PARAMETERS}
     comment += textwrap.indent(pprint.pformat(parameters), "//  ")
     comment += "\n"
 
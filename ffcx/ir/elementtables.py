@@ -6,6 +6,7 @@
 """Tools for precomputed tables of terminal values."""
 
 import collections
+import functools
 import logging
 
 import numpy
@@ -23,6 +24,9 @@ logger = logging.getLogger("ffcx")
 default_rtol = 1e-6
 default_atol = 1e-9
 
+# Number of tables of values kept in the cache of get_ffcx_table_values
+TABLE_CACHE_SIZE = 256
+
 piecewise_ttypes = ("piecewise", "fixed", "ones", "zeros")
 uniform_ttypes = ("fixed", "ones", "zeros", "uniform")
 
@@ -59,7 +63,22 @@ def get_ffcx_table_values(points, cell, integral_type, ufl_element, avg, entityt
 
     Returns a 3D numpy array with axes
     (entity number, quadrature point number, dof number)
+
+    The most recently used tables are cached, and a copy is returned.
     """
+    if points is not None:
+        points = numpy.ascontiguousarray(points, dtype=numpy.float64)
+        points = (points.tobytes(), points.shape)
+    table = _table_values(points, cell, integral_type, ufl_element, avg, entitytype,
+                          tuple(derivative_counts), flat_component)
+    return {'array': table['array'].copy(), 'offset': table['offset'], 'stride': table['stride']}
+
+
+@functools.lru_cache(maxsize=TABLE_CACHE_SIZE)
+def _table_values(points, cell, integral_type, ufl_element, avg, entitytype, derivative_counts, flat_component):
+    """Compute the values for get_ffcx_table_values, with the points given as (bytes, shape) to be hashable."""
+    if points is not None:
+        points = numpy.frombuffer(points[0], dtype=numpy.float64).reshape(points[1])
     deriv_order = sum(derivative_counts)
 
     if integral_type in ufl.custom_integral_types:
@@ -10,6 +10,7 @@ import itertools
 import logging
 
 import ufl
+from ffcx import profiling
 from ffcx.ir.analysis.factorization import \
     compute_argument_factorization
 from ffcx.ir.analysis.graph import build_scalar_graph
@@ -69,7 +70,8 @@ def compute_integral_ir(cell, integral_type, entitytype, integrands, argument_sh
         expression = replace_quadratureweight(expression)
 
         # Build initial scalar list-based graph representation
-        S = build_scalar_graph(expression)
+        with profiling.step("build_scalar_graph", "ir"):
+            S = build_scalar_graph(expression)
 
         # Build terminal_data from V here before factorization. Then we
         # can use it to derive table properties for all modified
@@ -81,15 +83,16 @@ def compute_integral_ir(cell, integral_type, entitytype, integrands, argument_sh
                              for i, v in S.nodes.items()
                              if is_modified_terminal(v['expression'])}
 
-        mt_table_reference = build_optimized_tables(
-            quadrature_rule,
-            cell,
-            integral_type,
-            entitytype,
-            initial_terminals.values(),
-            ir["unique_tables"],
-            rtol=p["table_rtol"],
-            atol=p["table_atol"])
+        with profiling.step("build_optimized_tables", "ir"):
+            mt_table_reference = build_optimized_tables(
+                quadrature_rule,
+                cell,
+                integral_type,
+                entitytype,
+                initial_terminals.values(),
+                ir["unique_tables"],
+                rtol=p["table_rtol"],
+                atol=p["table_atol"])
 
         # Fetch unique tables for this quadrature rule
         table_types = {v.name: v.ttype for v in mt_table_reference.values()}
@@ -119,7 +122,8 @@ def compute_integral_ir(cell, integral_type, entitytype, integrands, argument_sh
             expression = S.nodes[S_targets[0]]['expression']
 
             # Rebuild scalar list-based graph representation
-            S = build_scalar_graph(expression)
+            with profiling.step("build_scalar_graph", "ir"):
+                S = build_scalar_graph(expression)
 
         # Output diagnostic graph as pdf
         if visualise:
@@ -127,7 +131,8 @@ def compute_integral_ir(cell, integral_type, entitytype, integrands, argument_sh
 
         # Compute factorization of arguments
         rank = len(argument_shape)
-        F = compute_argument_factorization(S, rank)
+        with profiling.step("compute_argument_factorization", "ir"):
+            F = compute_argument_factorization(S, rank)
 
         # Get the 'target' nodes that are factors of arguments, and insert in dict
         FV_targets = [i for i, v in F.nodes.items() if v.get('target', False)]
@@ -16,14 +16,14 @@ should only need to use the data stored in the intermediate
 representation under the key "foo".
 """
 
-import itertools
+import functools
 import logging
 import warnings
 from collections import namedtuple
 
 import numpy
 import ufl
-from ffcx import naming
+from ffcx import naming, parallel, profiling
 from ffcx.element_interface import create_element
 from ffcx.ir.integral import compute_integral_ir
 from ffcx.ir.representationutils import (QuadratureRule,
@@ -61,9 +61,37 @@ ir_expression = namedtuple('ir_expression', [
 
 ir_data = namedtuple('ir_data', ['elements', 'dofmaps', 'integrals', 'forms', 'expressions'])
 
+_ENTITY_TYPES = {
+    "cell": "cell",
+    "exterior_facet": "facet",
+    "interior_facet": "facet",
+    "vertex": "vertex",
+    "custom": "cell"
+}
+
 
 def compute_ir(analysis: namedtuple, object_names, prefix, parameters, visualise):
     """Compute intermediate representation."""
+    irs = {field: [] for field in ir_data._fields}
+    for field, ir in _iter_ir(analysis, object_names, prefix, parameters, visualise, stream=False):
+        irs[field].append(ir)
+    return ir_data(**irs)
+
+
+def iter_ir(analysis: namedtuple, object_names, prefix, parameters, visualise):
+    """Compute intermediate representation one object at a time.
+
+    Yields pairs (field of ir_data, IR of an object) in the order of
+    :func:`compute_ir`. The IR of an integral is only computed when the
+    previous one has been consumed, and the preprocessed integrands of
+    the analysis are released as their IR is computed, so that the
+    analysis cannot be used again afterwards.
+    """
+    return _iter_ir(analysis, object_names, prefix, parameters, visualise, stream=True)
+
+
+def _iter_ir(analysis, object_names, prefix, parameters, visualise, stream):
+    """Compute intermediate representation, yielding (field of ir_data, IR) for every object."""
     logger.info(79 * "*")
     logger.info("Compiler stage 2: Computing intermediate representation of objects")
     logger.info(79 * "*")
@@ -71,8 +99,9 @@ def compute_ir(analysis: namedtuple, object_names, prefix, parameters, visualise
     # Compute object names
     # NOTE: This is done here for performance reasons, because repeated calls
     # within each IR computation would be expensive due to UFL signature computations
-    finite_element_names = {e: naming.finite_element_name(e, prefix) for e in analysis.unique_elements}
-    dofmap_names = {e: naming.dofmap_name(e, prefix) for e in analysis.unique_elements}
+    element_prefix = naming.element_prefix(prefix, parameters)
+    finite_element_names = {e: naming.finite_element_name(e, element_prefix) for e in analysis.unique_elements}
+    dofmap_names = {e: naming.dofmap_name(e, element_prefix) for e in analysis.unique_elements}
     integral_names = {}
     form_names = {}
     for fd_index, fd in enumerate(analysis.form_data):
@@ -81,40 +110,67 @@ def compute_ir(analysis: namedtuple, object_names, prefix, parameters, visualise
             integral_names[(fd_index, itg_index)] = naming.integral_name(fd.original_form, itg_data.integral_type,
                                                                          fd_index, itg_data.subdomain_id, prefix)
 
-    ir_elements = [
-        _compute_element_ir(e, analysis.element_numbers, finite_element_names)
-        for e in analysis.unique_elements
-    ]
-
-    ir_dofmaps = [
-        _compute_dofmap_ir(e, analysis.element_numbers, dofmap_names)
-        for e in analysis.unique_elements
-    ]
-
-    irs = [
-        _compute_integral_ir(fd, i, analysis.element_numbers, integral_names, finite_element_names,
-                             parameters, visualise)
-        for (i, fd) in enumerate(analysis.form_data)
-    ]
-    ir_integrals = list(itertools.chain(*irs))
-
-    ir_forms = [
-        _compute_form_ir(fd, i, prefix, form_names, integral_names, analysis.element_numbers, finite_element_names,
-                         dofmap_names, object_names)
-        for (i, fd) in enumerate(analysis.form_data)
-    ]
-
-    ir_expressions = [_compute_expression_ir(expr, i, prefix, analysis, parameters, visualise)
-                      for i, expr in enumerate(analysis.expressions)]
-
-    return ir_data(elements=ir_elements, dofmaps=ir_dofmaps,
-                   integrals=ir_integrals, forms=ir_forms,
-                   expressions=ir_expressions)
+    for e in analysis.unique_elements:
+        with profiling.span("element", finite_element_names[e]):
+            ir = _compute_element_ir(e, analysis.element_numbers, finite_element_names)
+        yield "elements", ir
+
+    for e in analysis.unique_elements:
+        with profiling.span("dofmap", dofmap_names[e]):
+            ir = _compute_dofmap_ir(e, analysis.element_numbers, dofmap_names)
+        yield "dofmaps", ir
+
+    integrals = [(fd, i, j) for (i, fd) in enumerate(analysis.form_data) for j in range(len(fd.integral_data))]
+    compute = functools.partial(_compute_integral_ir, element_numbers=analysis.element_numbers,
+                                integral_names=integral_names, finite_element_names=finite_element_names,
+                                parameters=parameters, visualise=visualise)
+    if stream:
+        # The IR of an integral only needs its own integrands, which
+        # are released (together with the preprocessed forms holding
+        # them) once it is computed
+        for fd in analysis.form_data:
+            fd.preprocessed_form = None
+        for integral in integrals:
+            ir = compute(integral)
+            form_data, _, j = integral
+            form_data.integral_data[j].integrals = []
+            yield "integrals", ir
+            del ir
+    else:
+        # The integrals are independent, and their IR (the bulk of the
+        # work of this stage) may be computed by several workers. The
+        # results are in the order of the integrals whatever the number
+        # of workers.
+        for ir in parallel.parallel_map(compute, integrals, parameters):
+            yield "integrals", ir
+
+    for (i, fd) in enumerate(analysis.form_data):
+        with profiling.span("form", form_names[i]):
+            ir = _compute_form_ir(fd, i, prefix, form_names, integral_names, analysis.element_numbers,
+                                  finite_element_names, dofmap_names, object_names)
+        yield "forms", ir
+
+    for i, expr in enumerate(analysis.expressions):
+        with profiling.span("expression", None) as entry:
+            ir = _compute_expression_ir(expr, i, prefix, analysis, parameters, visualise)
+            if entry is not None:
+                entry["name"] = ir.name
+                entry.update(_integrand_statistics(ir))
+        yield "expressions", ir
+
+
+def _integrand_statistics(ir):
+    """Return the sizes of the integrands in the IR of an integral or expression, for profiling."""
+    if not isinstance(ir, dict):
+        ir = ir._asdict()
+    return {"graph_nodes": sum(len(integrand["factorization"].nodes) for integrand in ir["integrand"].values()),
+            "unique_tables": len(ir["unique_tables"]),
+            "quadrature_points": sum(rule.points.shape[0] for rule in ir["integrand"])}
 
 
 def _compute_element_ir(ufl_element, element_numbers, finite_element_names):
     """Compute intermediate representation of element."""
-    logger.info(f"Computing IR for element {ufl_element}")
+    logger.info("Computing IR for element %s", ufl_element)
 
     # Create basix elements
     basix_element = create_element(ufl_element)
@@ -158,7 +214,7 @@ def _compute_element_ir(ufl_element, element_numbers, finite_element_names):
 
 def _compute_dofmap_ir(ufl_element, element_numbers, dofmap_names):
     """Compute intermediate representation of dofmap."""
-    logger.info(f"Computing IR for dofmap of {ufl_element}")
+    logger.info("Computing IR for dofmap of %s", ufl_element)
 
     # Create basix elements
     basix_element = create_element(ufl_element)
@@ -200,181 +256,176 @@ def _compute_dofmap_ir(ufl_element, element_numbers, dofmap_names):
     return ir_dofmap(**ir)
 
 
-def _compute_integral_ir(form_data, form_index, element_numbers, integral_names,
-                         finite_element_names, parameters, visualise):
-    """Compute intermediate represention for form integrals."""
-    _entity_types = {
-        "cell": "cell",
-        "exterior_facet": "facet",
-        "interior_facet": "facet",
-        "vertex": "vertex",
-        "custom": "cell"
+def _compute_integral_ir(integral, element_numbers, integral_names, finite_element_names, parameters, visualise):
+    """Compute intermediate represention for an integral group of a form.
+
+    The integral is given by the tuple (form data, form index, index of
+    the integral data in the form data).
+    """
+    form_data, form_index, itg_data_index = integral
+    itg_data = form_data.integral_data[itg_data_index]
+
+    logger.info("Computing IR for integral in integral group %s", itg_data_index)
+
+    # Compute representation
+    entitytype = _ENTITY_TYPES[itg_data.integral_type]
+    cell = itg_data.domain.ufl_cell()
+    cellname = cell.cellname()
+    tdim = cell.topological_dimension()
+    assert all(tdim == itg.ufl_domain().topological_dimension() for itg in itg_data.integrals)
+
+    ir = {
+        "integral_type": itg_data.integral_type,
+        "subdomain_id": itg_data.subdomain_id,
+        "rank": form_data.rank,
+        "geometric_dimension": form_data.geometric_dimension,
+        "topological_dimension": tdim,
+        "entitytype": entitytype,
+        "num_facets": cell.num_facets(),
+        "num_vertices": cell.num_vertices(),
+        "enabled_coefficients": itg_data.enabled_coefficients,
+        "cell_shape": cellname,
+        "coordinate_element": finite_element_names[itg_data.domain.ufl_coordinate_element()]
     }
 
-    # Iterate over groups of integrals
-    irs = []
-    for itg_data_index, itg_data in enumerate(form_data.integral_data):
-
-        logger.info(f"Computing IR for integral in integral group {itg_data_index}")
-
-        # Compute representation
-        entitytype = _entity_types[itg_data.integral_type]
-        cell = itg_data.domain.ufl_cell()
-        cellname = cell.cellname()
-        tdim = cell.topological_dimension()
-        assert all(tdim == itg.ufl_domain().topological_dimension() for itg in itg_data.integrals)
-
-        ir = {
-            "integral_type": itg_data.integral_type,
-            "subdomain_id": itg_data.subdomain_id,
-            "rank": form_data.rank,
-            "geometric_dimension": form_data.geometric_dimension,
-            "topological_dimension": tdim,
-            "entitytype": entitytype,
-            "num_facets": cell.num_facets(),
-            "num_vertices": cell.num_vertices(),
-            "enabled_coefficients": itg_data.enabled_coefficients,
-            "cell_shape": cellname,
-            "coordinate_element": finite_element_names[itg_data.domain.ufl_coordinate_element()]
-        }
-
-        # Get element space dimensions
-        unique_elements = element_numbers.keys()
-        ir["element_dimensions"] = {
-            ufl_element: create_element(ufl_element).dim
-            for ufl_element in unique_elements
-        }
-
-        ir["element_ids"] = {
-            ufl_element: i
-            for i, ufl_element in enumerate(unique_elements)
-        }
-
-        # Create dimensions of primary indices, needed to reset the argument
-        # 'A' given to tabulate_tensor() by the assembler.
-        argument_dimensions = [
-            ir["element_dimensions"][ufl_element] for ufl_element in form_data.argument_elements
-        ]
-
-        # Compute shape of element tensor
-        if ir["integral_type"] == "interior_facet":
-            ir["tensor_shape"] = [2 * dim for dim in argument_dimensions]
+    # Get element space dimensions
+    unique_elements = element_numbers.keys()
+    ir["element_dimensions"] = {
+        ufl_element: create_element(ufl_element).dim
+        for ufl_element in unique_elements
+    }
+
+    ir["element_ids"] = {
+        ufl_element: i
+        for i, ufl_element in enumerate(unique_elements)
+    }
+
+    # Create dimensions of primary indices, needed to reset the argument
+    # 'A' given to tabulate_tensor() by the assembler.
+    argument_dimensions = [
+        ir["element_dimensions"][ufl_element] for ufl_element in form_data.argument_elements
+    ]
+
+    # Compute shape of element tensor
+    if ir["integral_type"] == "interior_facet":
+        ir["tensor_shape"] = [2 * dim for dim in argument_dimensions]
+    else:
+        ir["tensor_shape"] = argument_dimensions
+
+    integral_type = itg_data.integral_type
+    cell = itg_data.domain.ufl_cell()
+
+    # Group integrands with the same quadrature rule
+    grouped_integrands = {}
+    for integral in itg_data.integrals:
+        md = integral.metadata() or {}
+        scheme = md["quadrature_rule"]
+        degree = md["quadrature_degree"]
+
+        if scheme == "custom":
+            points = md["quadrature_points"]
+            weights = md["quadrature_weights"]
+        elif scheme == "vertex":
+            # FIXME: Could this come from basix?
+
+            # The vertex scheme, i.e., averaging the function value in the
+            # vertices and multiplying with the simplex volume, is only of
+            # order 1 and inferior to other generic schemes in terms of
+            # error reduction. Equation systems generated with the vertex
+            # scheme have some properties that other schemes lack, e.g., the
+            # mass matrix is a simple diagonal matrix. This may be
+            # prescribed in certain cases.
+            if degree > 1:
+                warnings.warn(
+                    "Explicitly selected vertex quadrature (degree 1), but requested degree is {}.".
+                    format(degree))
+            if cellname == "tetrahedron":
+                points, weights = (numpy.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0],
+                                                [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]),
+                                   numpy.array([1.0 / 24.0, 1.0 / 24.0, 1.0 / 24.0, 1.0 / 24.0]))
+            elif cellname == "triangle":
+                points, weights = (numpy.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]]),
+                                   numpy.array([1.0 / 6.0, 1.0 / 6.0, 1.0 / 6.0]))
+            elif cellname == "interval":
+                # Trapezoidal rule
+                return (numpy.array([[0.0], [1.0]]), numpy.array([1.0 / 2.0, 1.0 / 2.0]))
         else:
-            ir["tensor_shape"] = argument_dimensions
-
-        integral_type = itg_data.integral_type
-        cell = itg_data.domain.ufl_cell()
-
-        # Group integrands with the same quadrature rule
-        grouped_integrands = {}
-        for integral in itg_data.integrals:
-            md = integral.metadata() or {}
-            scheme = md["quadrature_rule"]
-            degree = md["quadrature_degree"]
-
-            if scheme == "custom":
-                points = md["quadrature_points"]
-                weights = md["quadrature_weights"]
-            elif scheme == "vertex":
-                # FIXME: Could this come from basix?
-
-                # The vertex scheme, i.e., averaging the function value in the
-                # vertices and multiplying with the simplex volume, is only of
-                # order 1 and inferior to other generic schemes in terms of
-                # error reduction. Equation systems generated with the vertex
-                # scheme have some properties that other schemes lack, e.g., the
-                # mass matrix is a simple diagonal matrix. This may be
-                # prescribed in certain cases.
-                if degree > 1:
-                    warnings.warn(
-                        "Explicitly selected vertex quadrature (degree 1), but requested degree is {}.".
-                        format(degree))
-                if cellname == "tetrahedron":
-                    points, weights = (numpy.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0],
-                                                    [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]),
-                                       numpy.array([1.0 / 24.0, 1.0 / 24.0, 1.0 / 24.0, 1.0 / 24.0]))
-                elif cellname == "triangle":
-                    points, weights = (numpy.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]]),
-                                       numpy.array([1.0 / 6.0, 1.0 / 6.0, 1.0 / 6.0]))
-                elif cellname == "interval":
-                    # Trapezoidal rule
-                    return (numpy.array([[0.0], [1.0]]), numpy.array([1.0 / 2.0, 1.0 / 2.0]))
-            else:
-                points, weights = create_quadrature_points_and_weights(
-                    integral_type, cell, degree, scheme)
-
-            points = numpy.asarray(points)
-            weights = numpy.asarray(weights)
-
-            rule = QuadratureRule(points, weights)
-
-            if rule not in grouped_integrands:
-                grouped_integrands[rule] = []
-
-            grouped_integrands[rule].append(integral.integrand())
-
-        sorted_integrals = {}
-        for rule, integrands in grouped_integrands.items():
-            integrands_summed = sorted_expr_sum(integrands)
-
-            integral_new = Integral(integrands_summed, itg_data.integral_type, itg_data.domain,
-                                    itg_data.subdomain_id, {}, None)
-            sorted_integrals[rule] = integral_new
-
-        # TODO: See if coefficient_numbering can be removed
-        # Build coefficient numbering for UFC interface here, to avoid
-        # renumbering in UFL and application of replace mapping
-        coefficient_numbering = {}
-        for i, f in enumerate(form_data.reduced_coefficients):
-            coefficient_numbering[f] = i
-
-        # Add coefficient numbering to IR
-        ir["coefficient_numbering"] = coefficient_numbering
-
-        index_to_coeff = sorted([(v, k) for k, v in coefficient_numbering.items()])
-        offsets = {}
-        width = 2 if integral_type in ("interior_facet") else 1
-        _offset = 0
-        for k, el in zip(index_to_coeff, form_data.coefficient_elements):
-            offsets[k[1]] = _offset
-            _offset += width * ir["element_dimensions"][el]
-
-        # Copy offsets also into IR
-        ir["coefficient_offsets"] = offsets
-
-        # Build offsets for Constants
-        original_constant_offsets = {}
-        _offset = 0
-        for constant in form_data.original_form.constants():
-            original_constant_offsets[constant] = _offset
-            _offset += numpy.product(constant.ufl_shape, dtype=int)
-
-        ir["original_constant_offsets"] = original_constant_offsets
-
-        ir["precision"] = itg_data.metadata["precision"]
-
-        # Create map from number of quadrature points -> integrand
-        integrands = {rule: integral.integrand() for rule, integral in sorted_integrals.items()}
-
-        # Build more specific intermediate representation
+            points, weights = create_quadrature_points_and_weights(
+                integral_type, cell, degree, scheme)
+
+        points = numpy.asarray(points)
+        weights = numpy.asarray(weights)
+
+        rule = QuadratureRule(points, weights)
+
+        if rule not in grouped_integrands:
+            grouped_integrands[rule] = []
+
+        grouped_integrands[rule].append(integral.integrand())
+
+    sorted_integrals = {}
+    for rule, integrands in grouped_integrands.items():
+        integrands_summed = sorted_expr_sum(integrands)
+
+        integral_new = Integral(integrands_summed, itg_data.integral_type, itg_data.domain,
+                                itg_data.subdomain_id, {}, None)
+        sorted_integrals[rule] = integral_new
+
+    # TODO: See if coefficient_numbering can be removed
+    # Build coefficient numbering for UFC interface here, to avoid
+    # renumbering in UFL and application of replace mapping
+    coefficient_numbering = {}
+    for i, f in enumerate(form_data.reduced_coefficients):
+        coefficient_numbering[f] = i
+
+    # Add coefficient numbering to IR
+    ir["coefficient_numbering"] = coefficient_numbering
+
+    index_to_coeff = sorted([(v, k) for k, v in coefficient_numbering.items()])
+    offsets = {}
+    width = 2 if integral_type in ("interior_facet") else 1
+    _offset = 0
+    for k, el in zip(index_to_coeff, form_data.coefficient_elements):
+        offsets[k[1]] = _offset
+        _offset += width * ir["element_dimensions"][el]
+
+    # Copy offsets also into IR
+    ir["coefficient_offsets"] = offsets
+
+    # Build offsets for Constants
+    original_constant_offsets = {}
+    _offset = 0
+    for constant in form_data.original_form.constants():
+        original_constant_offsets[constant] = _offset
+        _offset += numpy.product(constant.ufl_shape, dtype=int)
+
+    ir["original_constant_offsets"] = original_constant_offsets
+
+    ir["precision"] = itg_data.metadata["precision"]
+
+    # Create map from number of quadrature points -> integrand
+    integrands = {rule: integral.integrand() for rule, integral in sorted_integrals.items()}
+
+    # Fetch name
+    ir["name"] = integral_names[(form_index, itg_data_index)]
+
+    # Build more specific intermediate representation
+    with profiling.span("integral", ir["name"]) as entry:
         integral_ir = compute_integral_ir(itg_data.domain.ufl_cell(), itg_data.integral_type,
                                           ir["entitytype"], integrands, ir["tensor_shape"],
                                           parameters, visualise)
+        if entry is not None:
+            entry.update(_integrand_statistics(integral_ir))
 
-        ir.update(integral_ir)
-
-        # Fetch name
-        ir["name"] = integral_names[(form_index, itg_data_index)]
-
-        irs.append(ir_integral(**ir))
+    ir.update(integral_ir)
 
-    return irs
+    return ir_integral(**ir)
 
 
 def _compute_form_ir(form_data, form_id, prefix, form_names, integral_names, element_numbers, finite_element_names,
                      dofmap_names, object_names):
     """Compute intermediate representation of form."""
-    logger.info(f"Computing IR for form {form_id}")
+    logger.info("Computing IR for form %s", form_id)
 
     # Store id
     ir = {"id": form_id}
@@ -453,7 +504,7 @@ def _compute_form_ir(form_data, form_id, prefix, form_names, integral_names, ele
 
 def _compute_expression_ir(expression, index, prefix, analysis, parameters, visualise):
     """Compute intermediate representation of expression."""
-    logger.info(f"Computing IR for expression {index}")
+    logger.info("Computing IR for expression %s", index)
 
     # Compute representation
     ir = {}
@@ -9,15 +9,18 @@ Parse command-line arguments and generate code from input UFL form files.
 """
 
 import argparse
+import concurrent.futures
 import cProfile
 import logging
 import pathlib
+import pstats
 import re
 import string
+import sys
+import time
 
-import ufl
 from ffcx import __version__ as FFCX_VERSION
-from ffcx import compiler, formatting
+from ffcx import builddb, profiling
 from ffcx.parameters import FFCX_DEFAULT_PARAMETERS, get_parameters
 
 logger = logging.getLogger("ffcx")
@@ -28,7 +31,32 @@ parser.add_argument(
     "--version", action='version', version=f"%(prog)s (version {FFCX_VERSION})")
 parser.add_argument("-o", "--output-directory", type=str, default=".", help="output directory")
 parser.add_argument("--visualise", action="store_true", help="visualise the IR graph")
-parser.add_argument("-p", "--profile", action='store_true', help="enable profiling")
+parser.add_argument("-p", "--profile", action='store_true',
+                    help="enable profiling, writing a profile per UFL file and their aggregate to ffcx.profile")
+parser.add_argument("-j", "--jobs", type=int, default=1,
+                    help="number of UFL files compiled concurrently, in separate processes (--trace only records "
+                    "the main process)")
+parser.add_argument("--force", action="store_true",
+                    help="compile all UFL files, including those whose generated files are up to date")
+parser.add_argument("--trace", type=str, metavar="FILE",
+                    help="write a trace of the compilation (Chrome trace event format) to FILE")
+parser.add_argument("--cache-dir", type=str,
+                    help="directory in which to cache generated code, reused when files are compiled again")
+parser.add_argument("--stream", action="store_true",
+                    help="generate and write the code of one integral at a time, which bounds peak memory for "
+                    "forms with many integrals (ignores --cache-dir)")
+parser.add_argument("--split", action="store_true",
+                    help="write one source file per element, dofmap, integral, form and expression, including a "
+                    "shared header, and CMake and make fragments (<prefix>.cmake, <prefix>.mk) listing them "
+                    "(ignores --stream)")
+parser.add_argument("--server", type=str, nargs="?", const="", metavar="SOCKET",
+                    help="compile with a compile server (see 'ffcx serve'), listening on SOCKET (default: "
+                    "$FFCX_SERVER_SOCKET or a socket in the temporary directory)")
+parser.add_argument("--watch", action="store_true",
+                    help="after compiling, keep watching the UFL files and compile them again when they change")
+parser.add_argument("--bundle", type=str, metavar="NAME",
+                    help="compile all forms and elements of the UFL files into one kernel bundle (shared library "
+                    "and manifest) for the JIT, instead of writing C code")
 
 # Add all parameters from FFCx parameter system
 for param_name, (param_val, param_desc) in FFCX_DEFAULT_PARAMETERS.items():
@@ -37,50 +65,246 @@ for param_name, (param_val, param_desc) in FFCX_DEFAULT_PARAMETERS.items():
 
 parser.add_argument("ufl_file", nargs='+', help="UFL file(s) to be compiled")
 
+# Arguments that only control how the files are compiled, which are not
+# passed on as parameters (and thus do not appear in the generated code)
+_RUN_ARGUMENTS = ("stream", "split", "cache_dir", "jobs", "force", "server", "watch", "trace", "bundle")
+
+serve_parser = argparse.ArgumentParser(
+    prog="ffcx serve",
+    description="Serve compile requests of FFCx clients on the same machine, keeping UFL, Basix and the caches "
+    "of elements, quadrature rules and tables loaded between requests")
+serve_parser.add_argument("--socket", type=str,
+                          help="socket to listen on (default: $FFCX_SERVER_SOCKET or a socket in the temporary "
+                          "directory)")
+serve_parser.add_argument("--verbosity", type=int, default=logging.WARNING, help="logger verbosity")
+
+
+def _sanitise_prefix(name):
+    """Remove weird characters (file system allows more than the C preprocessor)."""
+    prefix = re.subn("[^{}]".format(string.ascii_letters + string.digits + "_"), "!", name)[0]
+    return re.subn("!+", "_", prefix)[0]
+
+
+def _prefix(filename):
+    """Return the prefix of the code generated from a UFL file (and of the names of the generated files)."""
+    return _sanitise_prefix(pathlib.Path(filename).stem)
+
+
+def _build_bundle(xargs, parameters):
+    """Compile all UFL files into one kernel bundle."""
+    import ufl
+    from ffcx.codegeneration import jit
+
+    ufl_objects = []
+    for filename in xargs.ufl_file:
+        if pathlib.Path(filename).suffix != ".ufl":
+            logger.error("Expecting a UFL form file (.ufl).")
+            return 1
+        ufd = ufl.algorithms.load_ufl_file(filename)
+        ufl_objects += ufd.forms + ufd.elements
+
+    # Only FFCx parameters enter the signatures the JIT looks up
+    parameters = {k: v for k, v in parameters.items() if k in FFCX_DEFAULT_PARAMETERS}
+    manifest = jit.build_bundle(ufl_objects, _sanitise_prefix(xargs.bundle), xargs.output_directory, parameters)
+    logger.info(f"Wrote kernel bundle manifest {manifest}")
+    return 0
+
 
 def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    if len(args) > 0 and args[0] == "serve":
+        return _serve(args[1:])
+
     xargs = parser.parse_args(args)
 
     # Parse all other parameters
-    priority_parameters = {k: v for k, v in xargs.__dict__.items() if v is not None}
+    priority_parameters = {k: v for k, v in xargs.__dict__.items() if v is not None and k not in _RUN_ARGUMENTS}
     parameters = get_parameters(priority_parameters)
 
-    # Call parser and compiler for each file
+    if xargs.trace is not None:
+        with profiling.tracing(xargs.trace):
+            status = _compile_files(xargs, parameters)
+    else:
+        status = _compile_files(xargs, parameters)
+
+    if xargs.watch:
+        _watch(xargs, parameters)
+    return status
+
+
+def _serve(args):
+    """Run a compile server (see ffcx.server)."""
+    from ffcx import server
+
+    sargs = serve_parser.parse_args(args)
+    logging.basicConfig()
+    logger.setLevel(sargs.verbosity)
+    try:
+        server.serve(sargs.socket)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _watch(xargs, parameters, interval=1.0):
+    """Compile the UFL files again whenever they change, until interrupted."""
+    def mtimes():
+        return {filename: pathlib.Path(filename).stat().st_mtime_ns for filename in xargs.ufl_file}
+
+    logger.warning("Watching UFL files for changes (Ctrl-C to stop)")
+    previous = mtimes()
+    try:
+        while True:
+            time.sleep(interval)
+            try:
+                current = mtimes()
+            except FileNotFoundError:
+                # Being replaced by an editor
+                continue
+            changed = [filename for filename in xargs.ufl_file if current[filename] != previous[filename]]
+            previous = current
+            if not changed:
+                continue
+
+            logger.warning(f"Compiling {', '.join(changed)}")
+            try:
+                _compile_files(argparse.Namespace(**{**vars(xargs), "ufl_file": changed}), parameters)
+            except Exception as e:
+                logger.error("Failed to compile", exc_info=e)
+    except KeyboardInterrupt:
+        pass
+
+
+def _compile_files(xargs, parameters):
+    """Compile the UFL files given on the command line."""
+    if xargs.bundle is not None:
+        return _build_bundle(xargs, parameters)
+
     for filename in xargs.ufl_file:
-        file = pathlib.Path(filename)
-        if file.suffix != ".ufl":
+        if pathlib.Path(filename).suffix != ".ufl":
             logger.error("Expecting a UFL form file (.ufl).")
             return 1
 
-        # Remove weird characters (file system allows more than the C
-        # preprocessor)
-        prefix = file.stem
-        prefix = re.subn("[^{}]".format(string.ascii_letters + string.digits + "_"), "!", prefix)[0]
-        prefix = re.subn("!+", "_", prefix)[0]
+    # Skip the files whose generated files are up to date (see
+    # ffcx.builddb), unless forced or visualising
+    signatures = {filename: builddb.signature(filename, parameters, split=xargs.split) for filename in xargs.ufl_file}
+    db = builddb.load(xargs.output_directory)
+    filenames = []
+    for filename in xargs.ufl_file:
+        if not (xargs.force or xargs.visualise) and builddb.is_up_to_date(
+                db, _prefix(filename), signatures[filename], xargs.output_directory):
+            logger.info(f"{filename} is up to date")
+        else:
+            filenames.append(filename)
+
+    if xargs.jobs > 1 and len(filenames) > 1:
+        status, results = _compile_files_parallel(filenames, xargs, parameters)
+    else:
+        status, results = 0, {filename: _compile_file(filename, xargs, parameters) for filename in filenames}
 
-        # Turn on profiling
-        if xargs.profile:
-            pr = cProfile.Profile()
-            pr.enable()
+    # Remove the files generated before that are not generated any more
+    # (e.g. the source files of integrals that changed when split)
+    for filename, (outputs, profile) in results.items():
+        previous = db.get(_prefix(filename), {}).get("outputs", [])
+        for output in set(previous) - set(outputs):
+            output = pathlib.Path(xargs.output_directory, output)
+            if output.is_file():
+                output.unlink()
 
-        # Load UFL file
-        ufd = ufl.algorithms.load_ufl_file(filename)
+    builddb.update(xargs.output_directory, {_prefix(filename): (signatures[filename], outputs)
+                                            for filename, (outputs, profile) in results.items()})
+    profiles = [profile for outputs, profile in results.values() if profile is not None]
+
+    # Aggregate the profiles of all files
+    if xargs.profile and profiles:
+        pstats.Stats(*profiles).dump_stats("ffcx.profile")
+        logger.info(f"Wrote aggregate profile of {len(profiles)} files to ffcx.profile")
+
+    return status
+
+
+def _compile_files_parallel(filenames, xargs, parameters):
+    """Compile UFL files in a pool of processes.
 
-        # Generate code
+    The files that fail to compile are reported, without stopping the
+    compilation of the others. Returns the exit status and the results
+    of _compile_file for the files that were compiled.
+    """
+    status = 0
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=xargs.jobs) as executor:
+        futures = [executor.submit(_compile_file, filename, xargs, parameters) for filename in filenames]
+        for filename, future in zip(filenames, futures):
+            try:
+                results[filename] = future.result()
+            except Exception as e:
+                logger.error(f"Failed to compile {filename}", exc_info=e)
+                status = 1
+    return status, results
+
+
+def _compile_file(filename, xargs, parameters):
+    """Compile a UFL file, returning the names of the generated files and of the profile (None if not profiling)."""
+    prefix = _prefix(filename)
+
+    if xargs.server is not None:
+        # The server loads the file and generates the code
+        from ffcx import server
+        code_h, code_c = server.compile_file(filename, prefix, parameters, socket_path=xargs.server or None,
+                                             cache_dir=xargs.cache_dir, split=xargs.split)
+        return _write_code(code_h, code_c, prefix, xargs), None
+
+    # Imported here, so that e.g. --help and --version do not pay for
+    # importing UFL, Basix and the compiler
+    import ufl
+    from ffcx import compiler, formatting
+
+    # Turn on profiling
+    if xargs.profile:
+        pr = cProfile.Profile()
+        pr.enable()
+
+    # Load UFL file
+    ufd = ufl.algorithms.load_ufl_file(filename)
+
+    # Generate code
+    if xargs.stream and not xargs.split:
+        output = pathlib.Path(xargs.output_directory)
+        with formatting.open_output(output / f"{prefix}.h") as file_h, \
+                formatting.open_output(output / f"{prefix}.c") as file_c:
+            compiler.stream_ufl_objects(
+                ufd.forms if len(ufd.forms) > 0 else ufd.elements, file_h, file_c, ufd.object_names,
+                prefix=prefix, parameters=parameters, visualise=xargs.visualise)
+        outputs = [f"{prefix}.h", f"{prefix}.c"]
+    else:
         if len(ufd.forms) > 0:
             code_h, code_c = compiler.compile_ufl_objects(
-                ufd.forms, ufd.object_names, prefix=prefix, parameters=parameters, visualise=xargs.visualise)
+                ufd.forms, ufd.object_names, prefix=prefix, parameters=parameters, visualise=xargs.visualise,
+                split=xargs.split, cache_dir=xargs.cache_dir)
         else:
             code_h, code_c = compiler.compile_ufl_objects(
-                ufd.elements, ufd.object_names, prefix=prefix, parameters=parameters, visualise=xargs.visualise)
+                ufd.elements, ufd.object_names, prefix=prefix, parameters=parameters, visualise=xargs.visualise,
+                split=xargs.split, cache_dir=xargs.cache_dir)
 
         # Write to file
-        formatting.write_code(code_h, code_c, prefix, xargs.output_directory)
+        outputs = _write_code(code_h, code_c, prefix, xargs)
 
-        # Turn off profiling and write status to file
-        if xargs.profile:
-            pr.disable()
-            pfn = f"ffcx_{prefix}.profile"
-            pr.dump_stats(pfn)
+    # Turn off profiling and write status to file
+    pfn = None
+    if xargs.profile:
+        pr.disable()
+        pfn = f"ffcx_{prefix}.profile"
+        pr.dump_stats(pfn)
 
-    return 0
+    return outputs, pfn
+
+
+def _write_code(code_h, code_c, prefix, xargs):
+    """Write the generated code (split into several source files with --split), returning the names of the files."""
+    from ffcx import formatting
+
+    if xargs.split:
+        return formatting.write_code_split(code_h, code_c, prefix, xargs.output_directory)
+    formatting.write_code(code_h, code_c, prefix, xargs.output_directory)
+    return [f"{prefix}.h", f"{prefix}.c"]
@@ -4,11 +4,29 @@
 #
 # SPDX-License-Identifier:    LGPL-3.0-or-later
 
+import contextlib
+import contextvars
 import hashlib
+import os
 
 import ffcx
 import ufl
 
+# Hash function used to derive names of generated objects from
+# signatures. SHA-1 by default; with FFCX_NAMING_HASH=blake2b a faster
+# hash (of the same length) is used, which changes all generated names.
+if os.environ.get("FFCX_NAMING_HASH", "sha1") == "blake2b":
+    def _name_hash(data):
+        return hashlib.blake2b(data, digest_size=20)
+else:
+    _name_hash = hashlib.sha1
+
+# Signatures of UFL expressions memoized within a compilation (see
+# signature_scope), keyed by id. The expressions are kept alive by the
+# memo, so that their ids are not reused, but only until the compilation
+# ends. Forms are not memoized here: they cache their own signature.
+_signatures = contextvars.ContextVar("_signatures", default=None)
+
 
 def compute_signature(ufl_objects, tag):
     """Compute the signature hash.
@@ -16,80 +34,135 @@ def compute_signature(ufl_objects, tag):
     Based on the UFL type of the objects and an additional optional
     'tag'.
     """
+    return hashlib.sha1(_signature_string(ufl_objects, tag).encode('utf-8')).hexdigest()
+
+
+def _signature_string(ufl_objects, tag):
     object_signature = ""
     for ufl_object in ufl_objects:
-        # Get signature from ufl object
-        if isinstance(ufl_object, ufl.Form):
-            kind = "form"
-            object_signature += ufl_object.signature()
-        elif isinstance(ufl_object, ufl.FiniteElementBase):
-            object_signature += repr(ufl_object)
-            kind = "element"
-        elif isinstance(ufl_object, tuple) and isinstance(ufl_object[0], ufl.core.expr.Expr):
-            expr = ufl_object[0]
-            points = ufl_object[1]
-
-            # FIXME Move this to UFL, cache the computation
-            coeffs = ufl.algorithms.extract_coefficients(expr)
-            consts = ufl.algorithms.analysis.extract_constants(expr)
-            args = ufl.algorithms.analysis.extract_arguments(expr)
-
-            rn = dict()
-            rn.update(dict((c, i) for i, c in enumerate(coeffs)))
-            rn.update(dict((c, i) for i, c in enumerate(consts)))
-            rn.update(dict((c, i) for i, c in enumerate(args)))
-
-            domains = []
-            for coeff in coeffs:
-                domains.append(*coeff.ufl_domains())
-            for arg in args:
-                domains.append(*arg.ufl_domains())
-            for gc in ufl.algorithms.analysis.extract_type(expr, ufl.classes.GeometricQuantity):
-                domains.append(*gc.ufl_domains())
-
-            domains = ufl.algorithms.analysis.unique_tuple(domains)
-            rn.update(dict((d, i) for i, d in enumerate(domains)))
-
-            # Hash on UFL signature and points
-            signature = ufl.algorithms.signature.compute_expression_signature(expr, rn)
-            object_signature += signature
-            object_signature += repr(points)
-
-            kind = "expression"
-        else:
-            raise RuntimeError(f"Unknown ufl object type {ufl_object.__class__.__name__}")
+        kind, signature = _object_signature(ufl_object)
+        object_signature += signature
 
     # Build combined signature
     signatures = [object_signature, str(ffcx.__version__), ffcx.codegeneration.get_signature(), kind, tag]
-    string = ";".join(signatures)
-    return hashlib.sha1(string.encode('utf-8')).hexdigest()
+    return ";".join(signatures)
+
+
+def _object_signature(ufl_object):
+    """Return the kind and the signature of a UFL object."""
+    if isinstance(ufl_object, tuple) and isinstance(ufl_object[0], ufl.core.expr.Expr):
+        # Points may be modified in place, so only the expression
+        # signature is memoized
+        return "expression", _memoized_signature(ufl_object[0]) + repr(ufl_object[1])
+    elif isinstance(ufl_object, ufl.Form):
+        return "form", ufl_object.signature()
+    elif isinstance(ufl_object, ufl.FiniteElementBase):
+        return "element", repr(ufl_object)
+    else:
+        raise RuntimeError(f"Unknown ufl object type {ufl_object.__class__.__name__}")
+
+
+@contextlib.contextmanager
+def signature_scope():
+    """Memoize the signatures of UFL expressions within the context, or within the enclosing scope.
+
+    May be used as a decorator, e.g. of a function compiling UFL objects.
+    """
+    if _signatures.get() is not None:
+        yield
+        return
+    token = _signatures.set({})
+    try:
+        yield
+    finally:
+        _signatures.reset(token)
+
+
+def _memoized_signature(expr):
+    memo = _signatures.get()
+    if memo is None:
+        return _expression_signature(expr)
+    key = id(expr)
+    if key not in memo:
+        memo[key] = (expr, _expression_signature(expr))
+    return memo[key][1]
+
+
+def _expression_signature(expr):
+    # FIXME Move this to UFL
+    coeffs = ufl.algorithms.extract_coefficients(expr)
+    consts = ufl.algorithms.analysis.extract_constants(expr)
+    args = ufl.algorithms.analysis.extract_arguments(expr)
+
+    rn = dict()
+    rn.update(dict((c, i) for i, c in enumerate(coeffs)))
+    rn.update(dict((c, i) for i, c in enumerate(consts)))
+    rn.update(dict((c, i) for i, c in enumerate(args)))
+
+    domains = []
+    for coeff in coeffs:
+        domains.append(*coeff.ufl_domains())
+    for arg in args:
+        domains.append(*arg.ufl_domains())
+    for gc in ufl.algorithms.analysis.extract_type(expr, ufl.classes.GeometricQuantity):
+        domains.append(*gc.ufl_domains())
+
+    domains = ufl.algorithms.analysis.unique_tuple(domains)
+    rn.update(dict((d, i) for i, d in enumerate(domains)))
+
+    # Hash on UFL signature
+    return ufl.algorithms.signature.compute_expression_signature(expr, rn)
+
+
+def _name_signature(ufl_object, tag):
+    """Return the hash from which the name of a generated object is derived."""
+    return _name_hash(_signature_string([ufl_object], tag).encode('utf-8')).hexdigest()
 
 
 def integral_name(original_form, integral_type, form_id, subdomain_id, prefix):
-    sig = compute_signature([original_form], str((prefix, integral_type, form_id, subdomain_id)))
+    sig = _name_signature(original_form, str((prefix, integral_type, form_id, subdomain_id)))
     return f"integral_{sig}"
 
 
+def content_name(kind, code):
+    """Return the name of a generated object of a kind (e.g. "integral") derived from its code.
+
+    The code must not contain the name of the object itself, so that
+    the name only depends on what the object does.
+    """
+    return f"{kind}_{_name_hash(code.encode('utf-8')).hexdigest()}"
+
+
 def form_name(original_form, form_id, prefix):
-    sig = compute_signature([original_form], str((prefix, form_id)))
+    sig = _name_signature(original_form, str((prefix, form_id)))
     return f"form_{sig}"
 
 
+def element_prefix(prefix, parameters):
+    """Return the prefix from which the names of elements and dofmaps are derived.
+
+    With the parameter "content_addressed_names" there is none, so that
+    the names (and the code) of elements and dofmaps only depend on the
+    elements.
+    """
+    return "" if parameters["content_addressed_names"] else prefix
+
+
 def finite_element_name(ufl_element, prefix):
     assert isinstance(ufl_element, ufl.FiniteElementBase)
-    sig = compute_signature([ufl_element], prefix)
+    sig = _name_signature(ufl_element, prefix)
     return f"element_{sig}"
 
 
 def dofmap_name(ufl_element, prefix):
     assert isinstance(ufl_element, ufl.FiniteElementBase)
-    sig = compute_signature([ufl_element], prefix)
+    sig = _name_signature(ufl_element, prefix)
     return f"dofmap_{sig}"
 
 
 def expression_name(expression, prefix):
     assert isinstance(expression[0], ufl.core.expr.Expr)
-    sig = compute_signature([expression], prefix)
+    sig = _name_signature(expression, prefix)
     return f"expression_{sig}"
 
 
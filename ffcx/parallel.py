@@ -0,0 +1,62 @@
+# Copyright (C) 2021 FEniCS Project
+#
+# This file is part of FFCx. (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""Concurrent execution of independent compiler work.
+
+The compiler stages apply :func:`parallel_map` to independent items
+(e.g. integrals). The number and kind of workers are set by the
+parameters "workers" and "parallel_mode". Results are always returned in
+the order of the items, so that the generated code does not depend on
+these parameters.
+
+With "process" workers, the function and the items must be picklable,
+and the function must be defined at module level (e.g. a
+``functools.partial`` of a module-level function). Profiling spans of
+work done in other processes are not recorded.
+"""
+
+import concurrent.futures
+import contextvars
+import logging
+
+logger = logging.getLogger("ffcx")
+
+
+def parallel_map(function, items, parameters):
+    """Apply a function to each item, concurrently if the parameters ask for more than one worker.
+
+    Parameters
+    ----------
+    function : callable
+        Function of one argument.
+    items : iterable
+        Arguments of the function.
+    parameters : dict
+        FFCx parameters, of which "workers" and "parallel_mode" are used.
+
+    Returns
+    -------
+    list
+        Results, in the order of the items.
+
+    """
+    items = list(items)
+    workers = min(parameters.get("workers", 1), len(items))
+    if workers <= 1:
+        return [function(item) for item in items]
+
+    mode = parameters.get("parallel_mode", "thread")
+    logger.debug("Running %d tasks on %d %s workers", len(items), workers, mode)
+    if mode == "thread":
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ffcx") as executor:
+            # Run each item in a copy of the current context, so that
+            # e.g. an active profile is seen by the workers
+            futures = [executor.submit(contextvars.copy_context().run, function, item) for item in items]
+            return [f.result() for f in futures]
+    elif mode == "process":
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(function, items))
+    else:
+        raise ValueError(f"Unknown parallel_mode '{mode}', expected 'thread' or 'process'.")
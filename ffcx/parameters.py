@@ -33,10 +33,23 @@ FFCX_DEFAULT_PARAMETERS = {
                (-1 means no alignment assumed, safe option)"""),
     "padlen":
         (1, "Pads every declared array in tabulation kernel such that its last dimension is divisible by given value."),
+    "content_addressed_names":
+        (False, "Derive the names of integrals from their generated code, and of elements and dofmaps from the "
+                "elements only, so that identical objects get the same name and code whatever form (and UFL file) "
+                "they are part of. Their definitions are weak symbols."),
     "verbosity":
-        (30, "Logger verbosity. Follows standard logging library levels, i.e. INFO=20, DEBUG=10, etc.")
+        (30, "Logger verbosity. Follows standard logging library levels, i.e. INFO=20, DEBUG=10, etc."),
+    "workers":
+        (1, "Number of workers analyzing forms, computing the IR of integrals and generating code concurrently "
+            "(1 means serial)."),
+    "parallel_mode":
+        ("thread", "Kind of workers, 'thread' or 'process'.")
 }
 
+# Parameters that control how the compiler runs, but not the generated
+# code. They are left out of signatures and of the generated files.
+EXECUTION_PARAMETERS = ("workers", "parallel_mode")
+
 
 @functools.lru_cache(maxsize=None)
 def _load_parameters():
@@ -108,7 +121,8 @@ def get_parameters(priority_parameters: Optional[dict] = None) -> dict:
 
     logger.setLevel(parameters["verbosity"])
 
-    logger.info("Final parameter values")
-    logger.info(pprint.pformat(parameters))
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Final parameter values")
+        logger.info(pprint.pformat(parameters))
 
     return parameters
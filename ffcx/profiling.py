@@ -0,0 +1,288 @@
+# Copyright (C) 2021 FEniCS Project
+#
+# This file is part of FFCx. (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""Profiling and tracing of the compiler stages.
+
+Within :func:`profile`, the compiler records the wall time and the peak
+memory of every stage, and of the computation for every form, integral,
+element, dofmap and expression in each stage, into a :class:`Report`.
+
+Within :func:`tracing`, the same measurements, together with finer
+steps (see :func:`step`) of the analysis, the IR computation and the JIT
+compilation, are recorded as nested spans of all threads and written as
+a trace in the Chrome trace event format, which can be opened with
+Perfetto (https://ui.perfetto.dev) or chrome://tracing.
+
+Outside of these, :func:`span` and :func:`step` return a shared no-op
+context manager, so that instrumentation costs next to nothing.
+
+Peak memory is measured with :mod:`tracemalloc` (started for the
+duration of the profile if not already running). It covers all Python
+allocations of the process, including those of other threads.
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+_report = contextvars.ContextVar("ffcx_profiling_report", default=None)
+
+# Name of the stage being measured, inherited by the worker threads of
+# ffcx.parallel, so that objects measured there are attributed to it
+_stage = contextvars.ContextVar("ffcx_profiling_stage", default=None)
+
+# Trace recorded within tracing(), shared by all threads
+_tracer = None
+
+
+class Report:
+    """Wall time and peak memory of the compiler stages and of the objects compiled in each stage.
+
+    Attributes
+    ----------
+    stages
+        Mapping from stage name ("analysis", "ir", "codegen", "formatting")
+        to a dictionary with ``time`` (seconds) and ``peak_memory`` (bytes).
+    objects
+        List of dictionaries with ``stage``, ``kind`` ("form", "integral",
+        "element", "dofmap" or "expression"), ``name``, ``time`` and
+        ``peak_memory`` of every object in every stage. IR entries of
+        integrals and expressions also hold the number of nodes in the
+        factorised graph (``graph_nodes``), of unique tables
+        (``unique_tables``) and of quadrature points
+        (``quadrature_points``). Code generation entries hold the number
+        of generated lines of C (``c_lines``).
+
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.objects = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def by_object(self, kind=None):
+        """Return the entries of all objects (of a kind) merged across stages, slowest first.
+
+        Every merged entry holds the total ``time``, the largest
+        ``peak_memory``, the time of each stage under ``stage_times`` and
+        the counts of all stages.
+        """
+        merged = {}
+        for entry in self.objects:
+            if kind is not None and entry["kind"] != kind:
+                continue
+            m = merged.setdefault((entry["kind"], entry["name"]), {"kind": entry["kind"], "name": entry["name"],
+                                                                   "time": 0.0, "peak_memory": 0,
+                                                                   "stage_times": {}})
+            for key, value in entry.items():
+                if key not in ("stage", "kind", "name", "time", "peak_memory"):
+                    m[key] = value
+            m["time"] += entry["time"]
+            m["peak_memory"] = max(m["peak_memory"], entry["peak_memory"])
+            m["stage_times"][entry["stage"]] = m["stage_times"].get(entry["stage"], 0.0) + entry["time"]
+        return sorted(merged.values(), key=lambda m: m["time"], reverse=True)
+
+    def to_dict(self):
+        """Return the report as a dictionary of plain data."""
+        with self._lock:
+            return {"stages": dict(self.stages), "objects": list(self.objects)}
+
+    def to_json(self, path=None):
+        """Return the report as JSON, and write it to a file if a path is given."""
+        s = json.dumps(self.to_dict(), indent=2, default=str)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(s)
+        return s
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+
+class Trace:
+    """Spans recorded within :func:`tracing`, in the Chrome trace event format."""
+
+    def __init__(self):
+        self.events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def add(self, name, category, start, duration, args=None):
+        """Add a span, with start and duration in seconds (as measured by time.perf_counter)."""
+        event = {"name": name, "cat": category, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6,
+                 "pid": self._pid, "tid": threading.get_ident()}
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+            if event["tid"] not in self._threads:
+                self._threads[event["tid"]] = threading.current_thread().name
+
+    def to_dict(self):
+        """Return the trace as a dictionary in the Chrome trace event format."""
+        with self._lock:
+            names = [{"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": name}}
+                     for tid, name in self._threads.items()]
+            return {"traceEvents": names + list(self.events), "displayTimeUnit": "ms"}
+
+    def to_json(self, path=None):
+        """Return the trace as JSON, and write it to a file if a path is given."""
+        s = json.dumps(self.to_dict(), default=str)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(s)
+        return s
+
+
+class _Step:
+    """Span that is only traced."""
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.tracer.add(self.name, self.category, self.t0, time.perf_counter() - self.t0, self.args)
+        return False
+
+
+class _Span:
+    """Measurement of one stage, or of one object in a stage."""
+
+    def __init__(self, report, tracer, kind, name):
+        self.report = report
+        self.tracer = tracer
+        self.entry = {"kind": kind, "name": name}
+
+    def __enter__(self):
+        if self.report is not None:
+            stack = self.report._stack()
+            _update_peaks(stack)
+            self.memory = self.peak = tracemalloc.get_traced_memory()[0]
+            stack.append(self)
+            if self.entry["kind"] == "stage":
+                self.token = _stage.set(self.entry["name"])
+        self.t0 = time.perf_counter()
+        return self.entry
+
+    def __exit__(self, *args):
+        t = time.perf_counter() - self.t0
+        if self.tracer is not None:
+            self.tracer.add(str(self.entry["name"]), self.entry["kind"], self.t0, t,
+                            {k: v for k, v in self.entry.items() if k not in ("kind", "name")})
+        if self.report is None:
+            return False
+
+        stack = self.report._stack()
+        _update_peaks(stack)
+        stack.pop()
+        if self.entry["kind"] == "stage":
+            _stage.reset(self.token)
+
+        entry = self.entry
+        entry["time"] = t
+        entry["peak_memory"] = self.peak - self.memory
+        with self.report._lock:
+            if entry["kind"] == "stage":
+                stage = self.report.stages.setdefault(entry["name"], {"time": 0.0, "peak_memory": 0})
+                stage["time"] += t
+                stage["peak_memory"] = max(stage["peak_memory"], entry["peak_memory"])
+            else:
+                entry["stage"] = _stage.get()
+                self.report.objects.append(entry)
+        return False
+
+
+def _update_peaks(stack):
+    """Account the peak memory since the last update to all open spans."""
+    if not stack:
+        return
+    peak = tracemalloc.get_traced_memory()[1]
+    for s in stack:
+        s.peak = max(s.peak, peak)
+    if hasattr(tracemalloc, "reset_peak"):
+        # Python >= 3.9. Without it, peaks are those since the start of
+        # the profile, which overestimates the peaks of later spans.
+        tracemalloc.reset_peak()
+
+
+_null_span = contextlib.nullcontext()
+
+
+def span(kind, name):
+    """Return a context manager that measures a stage (kind "stage") or an object.
+
+    The context manager yields the entry of the measurement, to which
+    further data may be added, or None if neither a profile nor a trace
+    is being recorded.
+    """
+    report = _report.get()
+    tracer = _tracer
+    if report is None and tracer is None:
+        return _null_span
+    return _Span(report, tracer, kind, name)
+
+
+def step(name, category="ffcx", args=None):
+    """Return a context manager that adds a span (with optional arguments) to the trace, if one is being recorded."""
+    tracer = _tracer
+    if tracer is None:
+        return _null_span
+    return _Step(tracer, name, category, args)
+
+
+def active():
+    """Return True if a profile (in the current context) or a trace is being recorded."""
+    return _tracer is not None or _report.get() is not None
+
+
+@contextlib.contextmanager
+def profile():
+    """Record a profile of all compilation done in the context (of the current thread), and yield the report."""
+    report = Report()
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    token = _report.set(report)
+    try:
+        yield report
+    finally:
+        _report.reset(token)
+        if started:
+            tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def tracing(path=None):
+    """Record a trace of all compilation done in the context (in all threads), and yield the trace.
+
+    If a path is given, the trace is written to it in the Chrome trace
+    event format on exit.
+    """
+    global _tracer
+    previous = _tracer
+    trace = Trace()
+    _tracer = trace
+    try:
+        yield trace
+    finally:
+        _tracer = previous
+        if path is not None:
+            trace.to_json(path)
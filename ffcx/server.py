@@ -0,0 +1,289 @@
+# Copyright (C) 2021 FEniCS Project
+#
+# This file is part of FFCx. (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+"""Compile server.
+
+``ffcx serve`` starts a long-lived process that compiles UFL on request
+of clients on the same machine, listening on a Unix socket. The server
+imports UFL, Basix, the compiler and cffi once, and keeps the caches of
+elements, quadrature rules and tables (see
+:func:`ffcx.element_interface.create_element`,
+:func:`ffcx.element_interface.create_quadrature` and
+:func:`ffcx.ir.elementtables.get_ffcx_table_values`) warm across
+requests. The command-line interface sends UFL files to a server with
+``--server``, and :func:`compile_file`, :func:`compile_source`,
+:func:`compile_objects` and :func:`compile_jit` are the clients for
+Python.
+
+Requests and replies are pickled dictionaries, each preceded by its
+length. A request has a "command":
+
+"compile"
+    Compile the forms (or, if none, the elements) of the UFL file
+    "filename" or of a UFL file with the source "source", or the UFL
+    objects "objects" with the names "names" (pairs of object and name),
+    with the "prefix" and the "parameters". The reply has "code_h" and
+    "code_c", which is a list of (name, source) pairs if "split" (see
+    :func:`ffcx.formatting.format_code_split`).
+"jit"
+    Compile the UFL objects "objects" of a "kind" ("forms", "elements"
+    or "expressions") with the function ``compile_<kind>`` of
+    :mod:`ffcx.codegeneration.jit`, with the keyword arguments "kwargs".
+    The reply has the path of the compiled module in "module".
+"ping"
+    Check that the server is running.
+"shutdown"
+    Stop the server.
+
+If a request fails, the reply has the traceback in "error". Requests
+are handled one at a time.
+
+Since requests and replies are unpickled, which may execute arbitrary
+code, the socket must be in a directory that only the user running the
+server can access: the server and the clients refuse a directory that
+is a symbolic link, is owned by another user or has other permissions
+than 0700.
+"""
+
+import logging
+import os
+import pickle
+import socket
+import socketserver
+import struct
+import tempfile
+import traceback
+from pathlib import Path
+
+from ffcx.codegeneration import cache
+
+logger = logging.getLogger("ffcx")
+
+# Format of the length that precedes every message
+_LENGTH = struct.Struct("!Q")
+
+
+def default_socket():
+    """Return the default path of the socket: FFCX_SERVER_SOCKET, or a socket in a private temporary directory."""
+    path = os.environ.get("FFCX_SERVER_SOCKET")
+    if path:
+        return Path(path)
+    return Path(tempfile.gettempdir(), f"ffcx-server-{os.getuid()}", "ffcx.sock")
+
+
+def _check_directory(socket_path):
+    """Check that the directory of a socket is private to the user, raising PermissionError if not."""
+    cache.check_private_directory(Path(socket_path).parent)
+
+
+def _resolve(path):
+    """Return the absolute path of a directory given to the server (e.g. a cache directory), or None."""
+    return None if path is None else str(Path(path).resolve())
+
+
+def _send(sock, message):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(_LENGTH.pack(len(data)) + data)
+
+
+def _receive_exactly(sock, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(min(n - len(data), 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed before the end of the message.")
+        data += chunk
+    return bytes(data)
+
+
+def _receive(sock):
+    n, = _LENGTH.unpack(_receive_exactly(sock, _LENGTH.size))
+    return pickle.loads(_receive_exactly(sock, n))
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        try:
+            request = _receive(self.request)
+            command = request["command"]
+            logger.info(f"Compile server: {command} request")
+            if command == "shutdown":
+                self.server.stopping = True
+                reply = {}
+            else:
+                reply = _handle(request)
+        except Exception:
+            reply = {"error": traceback.format_exc()}
+            logger.error(f"Compile server: request failed\n{reply['error']}")
+        _send(self.request, reply)
+
+
+def _handle(request):
+    """Handle a request (other than shutdown) and return the reply."""
+    import ufl
+    from ffcx import compiler
+    from ffcx.codegeneration import jit
+    from ffcx.parameters import get_parameters
+
+    command = request["command"]
+    if command == "ping":
+        return {"pid": os.getpid()}
+    elif command == "compile":
+        parameters = get_parameters(request.get("parameters"))
+        if "filename" in request:
+            ufd = ufl.algorithms.load_ufl_file(request["filename"])
+            objects = ufd.forms if len(ufd.forms) > 0 else ufd.elements
+            object_names = ufd.object_names
+        elif "source" in request:
+            # Load the source as a UFL file, exactly as the command-line
+            # interface does
+            with tempfile.TemporaryDirectory() as tmpdir:
+                filename = Path(tmpdir, f"{request['prefix']}.ufl")
+                filename.write_text(request["source"])
+                ufd = ufl.algorithms.load_ufl_file(str(filename))
+            objects = ufd.forms if len(ufd.forms) > 0 else ufd.elements
+            object_names = ufd.object_names
+        else:
+            objects = request["objects"]
+            object_names = {id(obj): name for obj, name in request.get("names", [])}
+        code_h, code_c = compiler.compile_ufl_objects(objects, object_names, prefix=request["prefix"],
+                                                      parameters=parameters, split=request.get("split", False),
+                                                      cache_dir=request.get("cache_dir"))
+        return {"code_h": code_h, "code_c": code_c}
+    elif command == "jit":
+        if request["kind"] not in ("forms", "elements", "expressions"):
+            raise ValueError(f"Unknown kind of objects '{request['kind']}'.")
+        compile_function = getattr(jit, f"compile_{request['kind']}")
+        compiled, module, code = compile_function(request["objects"], **request.get("kwargs", {}))
+        return {"module": module.__file__}
+    else:
+        raise ValueError(f"Unknown command '{command}'.")
+
+
+class _Server(socketserver.UnixStreamServer):
+    stopping = False
+
+
+def serve(socket_path=None):
+    """Serve compile requests on a Unix socket until a shutdown request.
+
+    Parameters
+    ----------
+    socket_path : str
+        Path of the socket (default: see :func:`default_socket`).
+
+    """
+    socket_path = Path(socket_path or default_socket())
+    socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    _check_directory(socket_path)
+    if socket_path.exists():
+        if _is_running(socket_path):
+            raise RuntimeError(f"A compile server is already running on {socket_path}.")
+        socket_path.unlink()
+
+    # Warm up: import everything that compiling needs
+    import cffi  # noqa: F401
+    import ufl  # noqa: F401
+    from ffcx import compiler  # noqa: F401
+    from ffcx.codegeneration import jit  # noqa: F401
+
+    with _Server(str(socket_path), _Handler) as server:
+        os.chmod(socket_path, 0o600)
+        logger.warning(f"Compile server listening on {socket_path}")
+        try:
+            while not server.stopping:
+                server.handle_request()
+        finally:
+            socket_path.unlink()
+    logger.warning("Compile server stopped")
+
+
+def _is_running(socket_path):
+    try:
+        request({"command": "ping"}, socket_path)
+        return True
+    except OSError:
+        return False
+
+
+def request(message, socket_path=None):
+    """Send a request to a compile server and return the reply.
+
+    Raises RuntimeError, with the traceback of the server, if the
+    request failed, and PermissionError if the socket is not in a
+    directory private to the user.
+    """
+    socket_path = socket_path or default_socket()
+    _check_directory(socket_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        _send(sock, message)
+        reply = _receive(sock)
+    if "error" in reply:
+        raise RuntimeError(f"Compile server failed to handle the request:\n{reply['error']}")
+    return reply
+
+
+def compile_file(filename, prefix, parameters=None, socket_path=None, cache_dir=None, split=False):
+    """Compile a UFL file with a compile server, and return the header and source code.
+
+    The server loads the file itself, so that the file may import the
+    Python modules next to it. If split, the source code is a list of
+    (name, source) pairs, as from :func:`ffcx.compiler.compile_ufl_objects`.
+    """
+    reply = request({"command": "compile", "filename": str(Path(filename).resolve()), "prefix": prefix,
+                     "parameters": parameters, "cache_dir": _resolve(cache_dir), "split": split}, socket_path)
+    return reply["code_h"], reply["code_c"]
+
+
+def compile_source(source, prefix, parameters=None, socket_path=None, cache_dir=None):
+    """Compile the source of a UFL file with a compile server, and return the header and source code."""
+    reply = request({"command": "compile", "source": source, "prefix": prefix, "parameters": parameters,
+                     "cache_dir": _resolve(cache_dir)}, socket_path)
+    return reply["code_h"], reply["code_c"]
+
+
+def compile_objects(ufl_objects, prefix, object_names=None, parameters=None, socket_path=None, cache_dir=None):
+    """Compile UFL objects with a compile server, and return the header and source code.
+
+    As :func:`ffcx.compiler.compile_ufl_objects`, but the object names
+    must be of the objects in ``ufl_objects`` or of their arguments,
+    coefficients and constants.
+    """
+    if object_names is None:
+        object_names = {}
+    names = []
+    for obj in ufl_objects:
+        candidates = [obj]
+        if hasattr(obj, "arguments"):
+            candidates += list(obj.arguments()) + list(obj.coefficients()) + list(obj.constants())
+        names += [(o, object_names[id(o)]) for o in candidates if id(o) in object_names]
+    reply = request({"command": "compile", "objects": list(ufl_objects), "names": names, "prefix": prefix,
+                     "parameters": parameters, "cache_dir": _resolve(cache_dir)}, socket_path)
+    return reply["code_h"], reply["code_c"]
+
+
+def compile_jit(kind, ufl_objects, socket_path=None, **kwargs):
+    """JIT compile UFL objects with a compile server, and return the path of the compiled module.
+
+    Parameters
+    ----------
+    kind : str
+        "forms", "elements" or "expressions".
+    ufl_objects : list
+        Objects to compile.
+    socket_path : str
+        Path of the socket of the server.
+    kwargs
+        Keyword arguments of the function ``compile_<kind>`` of
+        :mod:`ffcx.codegeneration.jit`, e.g. "parameters" and
+        "cache_dir".
+
+    """
+    if kwargs.get("cache_dir") is not None:
+        kwargs["cache_dir"] = _resolve(kwargs["cache_dir"])
+    return request({"command": "jit", "kind": kind, "objects": list(ufl_objects), "kwargs": kwargs},
+                   socket_path)["module"]
@@ -4,9 +4,18 @@
 #
 # SPDX-License-Identifier:    LGPL-3.0-or-later
 
+import asyncio
+import concurrent.futures
+import json
+import os
+import pathlib
 import sys
+import tempfile
+import time
 
+import ffcx.codegeneration.cache
 import ffcx.codegeneration.jit
+import pytest
 import ufl
 
 
@@ -33,3 +42,274 @@ def test_cache_modes(compile_args):
 
     assert(newname == tmpname)
     assert(newfile != tmpfile)
+
+
+def test_cache_eviction(tmp_path, compile_args):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a0 = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx
+    a1 = ufl.inner(u, v) * ufl.dx
+
+    _, module0, _ = ffcx.codegeneration.jit.compile_forms(
+        [a0], cache_dir=tmp_path, cffi_extra_compile_args=compile_args)
+    assert ffcx.codegeneration.cache.size(tmp_path) > 0
+
+    # A size cap of one byte evicts everything but the module just compiled
+    _, module1, _ = ffcx.codegeneration.jit.compile_forms(
+        [a1], cache_dir=tmp_path, cffi_extra_compile_args=compile_args, cache_max_size=1)
+    assert not list(tmp_path.glob(module0.__name__ + ".*"))
+    assert list(tmp_path.glob(module1.__name__ + ".*"))
+    assert not tmp_path.joinpath("locks", module0.__name__ + ".lock").exists()
+
+    # A module that another process is loading (holding its lock) is kept
+    lock = ffcx.codegeneration.cache.lock_module(tmp_path, module1.__name__)
+    try:
+        assert module1.__name__ not in ffcx.codegeneration.cache.evict(tmp_path, max_size=1)
+        assert list(tmp_path.glob(module1.__name__ + ".*"))
+    finally:
+        lock.close()
+    assert module1.__name__ in ffcx.codegeneration.cache.evict(tmp_path, max_size=1)
+    assert not list(tmp_path.glob(module1.__name__ + ".*"))
+
+
+def test_scratch_dir(compile_args):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(u, v) * ufl.dx
+
+    # Without a cache directory, modules are built in the per-process scratch directory
+    _, module, _ = ffcx.codegeneration.jit.compile_forms([a], cffi_extra_compile_args=compile_args)
+    scratch_dir = ffcx.codegeneration.cache.scratch_dir()
+    assert pathlib.Path(module.__file__).parent == scratch_dir
+    assert (scratch_dir.stat().st_mode & 0o777) == 0o700
+
+    # The scratch directory of a process that ended without removing it
+    # is removed, and the directory of this process is kept
+    stale = pathlib.Path(tempfile.mkdtemp(prefix=ffcx.codegeneration.cache.SCRATCH_PREFIX))
+    stale.joinpath(ffcx.codegeneration.cache.SCRATCH_LOCK_FILENAME).touch()
+    ffcx.codegeneration.cache._remove_stale_scratch_dirs()
+    assert not stale.exists()
+    assert scratch_dir.is_dir()
+
+
+def test_module_registry(tmp_path, compile_args):
+    cell = ufl.tetrahedron
+    element = ufl.FiniteElement("Lagrange", cell, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx
+
+    # Concurrent requests for the same form share a single compilation
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(ffcx.codegeneration.jit.compile_forms, [a], cache_dir=tmp_path,
+                                   cffi_extra_compile_args=compile_args) for i in range(4)]
+        results = [f.result() for f in futures]
+    assert len(set(id(module) for _, module, _ in results)) == 1
+    assert sum(code != (None, None) for _, _, code in results) == 1
+
+    # Repeated requests are served from the registry
+    _, module, code = ffcx.codegeneration.jit.compile_forms([a], cache_dir=tmp_path,
+                                                            cffi_extra_compile_args=compile_args)
+    assert module is results[0][1]
+    assert code == (None, None)
+
+
+def test_compile_lock(tmp_path, compile_args):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 3)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(u, v) * ufl.dx
+
+    # Obtain the lock of the module as if we were compiling it
+    _, _, lock = ffcx.codegeneration.jit.get_cached_module("libffcx_test_lock", [], tmp_path, 1)
+    assert lock is not None
+    t0 = time.time()
+    with pytest.raises(TimeoutError):
+        ffcx.codegeneration.jit.get_cached_module("libffcx_test_lock", [], tmp_path, 0.2)
+    assert time.time() - t0 < 1.0
+
+    # Once the lock is released (or its holder dies) the next caller takes over
+    lock.close()
+    _, _, lock = ffcx.codegeneration.jit.get_cached_module("libffcx_test_lock", [], tmp_path, 0.2)
+    assert lock is not None
+    lock.close()
+
+    _, module, _ = ffcx.codegeneration.jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args)
+    assert tmp_path.joinpath(module.__name__ + ".c.cached").exists()
+
+
+def test_failure_replay(tmp_path):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(u, v) * ufl.ds
+    compile_args = ["-fno-such-compiler-option"]
+
+    with pytest.raises(Exception):
+        ffcx.codegeneration.jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args)
+
+    # The recorded failure is replayed without compiling again
+    t0 = time.time()
+    with pytest.raises(RuntimeError, match="failed previously"):
+        ffcx.codegeneration.jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args,
+                                              timeout=60)
+    assert time.time() - t0 < 1.0
+
+    # Other compiler flags give a different module
+    ffcx.codegeneration.jit.compile_forms([a], cache_dir=tmp_path)
+
+    assert len(ffcx.codegeneration.cache.clear_failures(tmp_path)) == 1
+    with pytest.raises(Exception) as e:
+        ffcx.codegeneration.jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args)
+    assert "failed previously" not in str(e.value)
+
+
+def test_async(tmp_path, compile_args):
+    cell = ufl.quadrilateral
+    element = ufl.FiniteElement("Lagrange", cell, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx
+
+    future = ffcx.codegeneration.jit.submit_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args)
+    _, module_async, _ = asyncio.run(ffcx.codegeneration.jit.compile_forms_async(
+        [a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args))
+    _, module_future, _ = future.result()
+    _, module, _ = ffcx.codegeneration.jit.compile_forms([a], cache_dir=tmp_path,
+                                                         cffi_extra_compile_args=compile_args)
+
+    # Synchronous and asynchronous calls share one compiled module
+    assert module is module_async and module is module_future
+
+
+def test_bundle(tmp_path, compile_args):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("N1curl", cell, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(ufl.curl(u), ufl.curl(v)) * ufl.dx
+    L = ufl.inner(ufl.as_vector((1.0, 0.0)), v) * ufl.dx
+
+    manifest = ffcx.codegeneration.jit.build_bundle([a, L, element], "test_bundle", tmp_path,
+                                                    cffi_extra_compile_args=compile_args)
+    ffcx.codegeneration.jit.load_bundle(manifest)
+    try:
+        # Requests for bundled objects are served without a cache directory or compiler
+        cache_dir = tmp_path.joinpath("cache")
+        forms, module, code = ffcx.codegeneration.jit.compile_forms([L, a], cache_dir=cache_dir)
+        assert module.__name__ == "libffcx_bundle_test_bundle"
+        assert code == (None, None)
+        assert forms[0].rank == 1 and forms[1].rank == 2
+        elements, module, _ = ffcx.codegeneration.jit.compile_elements([element], cache_dir=cache_dir)
+        assert module.__name__ == "libffcx_bundle_test_bundle"
+        assert not cache_dir.exists()
+    finally:
+        ffcx.codegeneration.jit.unload_bundle(manifest)
+
+    # Once unloaded, the objects are compiled again
+    forms, module, code = ffcx.codegeneration.jit.compile_forms([a], cache_dir=cache_dir,
+                                                                cffi_extra_compile_args=compile_args)
+    assert module.__name__ != "libffcx_bundle_test_bundle"
+
+
+def test_metrics(tmp_path, compile_args):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 3)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx
+
+    jit = ffcx.codegeneration.jit
+    jit.reset_metrics()
+    jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args)
+    jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args)
+    jit.clear_module_registry()
+    jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args)
+
+    metrics = jit.get_metrics()
+    assert metrics["counters"]["misses"] == 1
+    assert metrics["counters"]["memory_hits"] == 1
+    assert metrics["counters"]["disk_hits"] == 1
+    for stage in ("analysis", "ir", "codegen", "formatting", "c_compile", "module_load"):
+        assert metrics["times"][stage] > 0
+    assert metrics["bytes_written"] > 0
+    assert metrics["cache_size"][str(tmp_path)] == ffcx.codegeneration.cache.size(tmp_path)
+
+    dumped = json.loads(jit.dump_metrics(tmp_path / "metrics.json"))
+    assert dumped["counters"] == metrics["counters"]
+    assert json.loads((tmp_path / "metrics.json").read_text()) == dumped
+
+    jit.reset_metrics()
+    assert jit.get_metrics()["counters"]["misses"] == 0
+
+
+def test_code_cache(tmp_path, compile_args):
+    cell = ufl.quadrilateral
+    element = ufl.FiniteElement("Q", cell, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(u, v) * ufl.dx
+
+    jit = ffcx.codegeneration.jit
+    jit.reset_metrics()
+    _, module0, _ = jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args)
+    analysis_time = jit.get_metrics()["times"]["analysis"]
+
+    # Other compiler flags give another module, built from the cached code
+    _, module1, _ = jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args + ["-DFFCX_TEST"])
+    assert module0.__name__ != module1.__name__
+    assert len(list(tmp_path.glob(ffcx.codegeneration.cache.CODE_PREFIX + "*.json"))) == 1
+
+    metrics = jit.get_metrics()
+    assert metrics["counters"]["misses"] == 2
+    assert metrics["times"]["analysis"] == analysis_time
+
+
+class _Rank1Communicator:
+    """Communicator of rank 1, to which rank 0 has broadcast a message."""
+
+    rank = 1
+
+    def __init__(self, message):
+        self.message = message
+
+    def bcast(self, obj, root=0):
+        return self.message
+
+    def barrier(self):
+        pass
+
+
+def test_comm(tmp_path, compile_args, monkeypatch):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("N1curl", cell, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(u, v) * ufl.dx
+
+    jit = ffcx.codegeneration.jit
+    compiled, module, _ = jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args,
+                                            comm=jit.SerialCommunicator())
+    assert pathlib.Path(module.__file__).parent == tmp_path
+
+    # Other ranks load a node-local copy of the module compiled by rank 0
+    monkeypatch.setenv("FFCX_JIT_STAGING_DIR", str(tmp_path / "staging"))
+    comm = _Rank1Communicator((None, module.__file__))
+    compiled1, module1, _ = jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args,
+                                              comm=comm)
+    assert pathlib.Path(module1.__file__).parent == tmp_path / "staging"
+    assert compiled1[0].rank == compiled[0].rank
+
+    # A staged file that differs from the module is replaced, and old
+    # staged files are removed
+    staged = pathlib.Path(module1.__file__)
+    staged.write_bytes(b"not a module")
+    old = tmp_path / "staging" / "old.so"
+    old.write_bytes(b"old")
+    os.utime(old, (0, 0))
+    jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args, comm=comm)
+    assert staged.read_bytes() == pathlib.Path(module.__file__).read_bytes()
+    assert not old.exists()
+
+    with pytest.raises(ValueError):
+        jit.compile_forms([a], cffi_extra_compile_args=compile_args, comm=jit.SerialCommunicator())
+
+    comm = _Rank1Communicator(("RuntimeError: compiler error", None))
+    with pytest.raises(RuntimeError, match="failed on rank 0"):
+        jit.compile_forms([a], cache_dir=tmp_path, cffi_extra_compile_args=compile_args, comm=comm)
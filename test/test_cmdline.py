@@ -7,6 +7,11 @@
 import os
 import os.path
 import subprocess
+import time
+
+import ffcx.builddb
+import ffcx.parameters
+import ffcx.server
 
 
 def test_cmdline_simple():
@@ -19,3 +24,155 @@ def test_visualise():
     subprocess.run(["ffcx", "--visualise", "Poisson.ufl"])
     assert os.path.isfile("S.pdf")
     assert os.path.isfile("F.pdf")
+
+
+def test_stream(tmp_path):
+    ufl_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Poisson.ufl")
+    for name, args in (("full", []), ("stream", ["--stream"])):
+        (tmp_path / name).mkdir()
+        subprocess.run(["ffcx", *args, ufl_file], cwd=tmp_path / name, check=True)
+    for suffix in (".h", ".c"):
+        assert (tmp_path / "stream" / f"Poisson{suffix}").read_text() == \
+            (tmp_path / "full" / f"Poisson{suffix}").read_text()
+
+
+def test_cache_dir(tmp_path):
+    ufl_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Poisson.ufl")
+    for name, args in (("plain", []), ("cached", ["--cache-dir", str(tmp_path / "cache")])):
+        (tmp_path / name).mkdir()
+        subprocess.run(["ffcx", *args, ufl_file], cwd=tmp_path / name, check=True)
+    for suffix in (".h", ".c"):
+        assert (tmp_path / "cached" / f"Poisson{suffix}").read_text() == \
+            (tmp_path / "plain" / f"Poisson{suffix}").read_text()
+
+
+def test_trace(tmp_path):
+    ufl_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Poisson.ufl")
+    for name, args in (("plain", []), ("traced", ["--trace", str(tmp_path / "trace.json")])):
+        (tmp_path / name).mkdir()
+        subprocess.run(["ffcx", *args, ufl_file], cwd=tmp_path / name, check=True)
+    assert (tmp_path / "trace.json").is_file()
+    for suffix in (".h", ".c"):
+        assert (tmp_path / "traced" / f"Poisson{suffix}").read_text() == \
+            (tmp_path / "plain" / f"Poisson{suffix}").read_text()
+
+
+def test_jobs(tmp_path):
+    source = open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Poisson.ufl")).read()
+    names = ["Poisson1.ufl", "Poisson2.ufl", "Poisson3.ufl"]
+    for name, args in (("serial", []), ("parallel", ["-j", "3"])):
+        (tmp_path / name).mkdir()
+        for ufl_file in names:
+            (tmp_path / name / ufl_file).write_text(source)
+        subprocess.run(["ffcx", *args, *names], cwd=tmp_path / name, check=True)
+    for ufl_file in names:
+        for suffix in (".h", ".c"):
+            output = ufl_file.replace(".ufl", suffix)
+            assert (tmp_path / "parallel" / output).read_text() == (tmp_path / "serial" / output).read_text()
+
+    # A file that fails is reported, and the others are still compiled
+    # and profiled
+    (tmp_path / "parallel" / "Broken.ufl").write_text("a = undefined * dx\n")
+    result = subprocess.run(["ffcx", "-j", "2", "--profile", "Broken.ufl", *names], cwd=tmp_path / "parallel",
+                            capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "Broken.ufl" in result.stderr
+    assert (tmp_path / "parallel" / "ffcx.profile").is_file()
+    assert not (tmp_path / "parallel" / "Broken.c").exists()
+
+
+def test_incremental(tmp_path):
+    source = open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Poisson.ufl")).read()
+    (tmp_path / "Poisson.ufl").write_text(source)
+    code = tmp_path / "Poisson.c"
+
+    def ffcx(*args):
+        subprocess.run(["ffcx", *args, "Poisson.ufl"], cwd=tmp_path, check=True)
+
+    ffcx()
+    generated = code.read_text()
+
+    # Nothing changed: the file is not compiled again
+    code.write_text("stale")
+    ffcx()
+    assert code.read_text() == "stale"
+
+    # Nor with parameters that do not change the code
+    ffcx("--workers", "2")
+    assert code.read_text() == "stale"
+
+    ffcx("--force")
+    assert code.read_text() == generated
+
+    # The file is compiled again, but the generated code is the same and
+    # is not rewritten
+    mtime = code.stat().st_mtime_ns
+    (tmp_path / "Poisson.ufl").write_text(source + "\n# Comment\n")
+    ffcx()
+    assert code.stat().st_mtime_ns == mtime
+
+    # A change of the parameters changes the code
+    ffcx("--scalar_type", "float")
+    assert code.read_text() != generated
+
+
+def test_builddb_signature():
+    ufl_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Poisson.ufl")
+    signature = ffcx.builddb.signature(ufl_file, ffcx.parameters.get_parameters())
+    assert ffcx.builddb.signature(ufl_file, ffcx.parameters.get_parameters({"workers": 4})) == signature
+    assert ffcx.builddb.signature(ufl_file, ffcx.parameters.get_parameters({"scalar_type": "float"})) != signature
+
+
+def test_server(tmp_path):
+    ufl_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Poisson.ufl")
+    # The socket must be in a directory private to the user
+    (tmp_path / "socket").mkdir(mode=0o700)
+    (tmp_path / "socket").chmod(0o700)
+    socket_path = str(tmp_path / "socket" / "ffcx.sock")
+    server = subprocess.Popen(["ffcx", "serve", "--socket", socket_path])
+    try:
+        for i in range(100):
+            if os.path.exists(socket_path):
+                break
+            time.sleep(0.1)
+        for name, args in (("local", []), ("server", ["--server", socket_path])):
+            (tmp_path / name).mkdir()
+            subprocess.run(["ffcx", *args, ufl_file], cwd=tmp_path / name, check=True)
+    finally:
+        ffcx.server.request({"command": "shutdown"}, socket_path)
+        server.wait(timeout=10)
+    for suffix in (".h", ".c"):
+        assert (tmp_path / "server" / f"Poisson{suffix}").read_text() == \
+            (tmp_path / "local" / f"Poisson{suffix}").read_text()
+
+
+def test_split(tmp_path):
+    source = open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Poisson.ufl")).read()
+    (tmp_path / "Poisson.ufl").write_text(source)
+
+    def sources():
+        subprocess.run(["ffcx", "--split", "Poisson.ufl"], cwd=tmp_path, check=True)
+        assert (tmp_path / "Poisson.h").is_file()
+        listed = [line.split(")")[-1].rstrip(" \\") for line in (tmp_path / "Poisson.mk").read_text().splitlines()
+                  if line.startswith("    $(Poisson_DIR)")]
+        assert sorted(listed) == sorted(path.name for path in tmp_path.glob("Poisson_*.c"))
+        assert f"${{CMAKE_CURRENT_LIST_DIR}}/{listed[0]}" in (tmp_path / "Poisson.cmake").read_text()
+        for name in listed:
+            assert '#include "Poisson.h"' in (tmp_path / name).read_text()
+            assert "split" not in (tmp_path / name).read_text()
+        return set(listed)
+
+    # One source file per element, dofmap, integral and form
+    first = sources()
+    assert len([name for name in first if name.startswith("Poisson_integral_")]) == 2
+    assert len([name for name in first if name.startswith("Poisson_form_")]) == 2
+
+    # The source files of the integrals of a changed form are replaced
+    (tmp_path / "Poisson.ufl").write_text(source.replace("L = f*v*dx", "L = f*f*v*dx"))
+    second = sources()
+    assert first != second
+
+    # Compiling without --split is not skipped as up to date
+    subprocess.run(["ffcx", "Poisson.ufl"], cwd=tmp_path, check=True)
+    assert (tmp_path / "Poisson.c").is_file()
+    assert not list(tmp_path.glob("Poisson_*.c"))
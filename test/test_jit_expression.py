@@ -9,6 +9,7 @@ import numpy as np
 
 import cffi
 import ffcx.codegeneration.jit
+import ffcx.naming
 import ufl
 
 
@@ -141,3 +142,22 @@ def test_rank1(compile_args):
     u_correct = np.array([f[1], f[0]]) + gradf0
 
     assert np.allclose(u_ffcx, u_correct.T)
+
+
+def test_expression_signature():
+    e = ufl.FiniteElement("P", "triangle", 1)
+    mesh = ufl.Mesh(ufl.VectorElement("P", "triangle", 1))
+    f = ufl.Coefficient(ufl.FunctionSpace(mesh, e))
+    expr = ufl.grad(f)
+
+    points = np.array([[0.0, 0.0], [1.0, 0.0]])
+    signature = ffcx.naming.compute_signature([(expr, points)], "")
+    with ffcx.naming.signature_scope():
+        assert ffcx.naming.compute_signature([(expr, points)], "") == signature
+
+        # The expression signature is memoized, but points may change in place
+        points[1, 0] = 0.5
+        assert ffcx.naming.compute_signature([(expr, points)], "") != signature
+
+    # The memoized expressions are released at the end of the scope
+    assert ffcx.naming._signatures.get() is None
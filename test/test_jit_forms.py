@@ -8,6 +8,9 @@ import numpy as np
 import pytest
 
 import ffcx.codegeneration.jit
+import ffcx.compiler
+import ffcx.naming
+import ffcx.parameters
 from ffcx.naming import cdtype_to_numpy
 import ufl
 import sympy
@@ -299,6 +302,37 @@ def test_subdomains(compile_args):
     assert ids[0] == 0 and ids[1] == 210
 
 
+def test_translation_units(compile_args):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a0 = ufl.inner(u, v) * ufl.dx + ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx(1)
+    a1 = ufl.inner(u, v) * ufl.ds
+    forms = [a0, a1]
+
+    # Compile each integral, form and element in its own translation unit
+    compiled_forms, module, code = ffcx.codegeneration.jit.compile_forms(
+        forms, cffi_extra_compile_args=compile_args, cffi_jobs=4)
+    assert code[1].count("#include <ufc.h>") > 1
+
+    ffi = module.ffi
+    default_integral = compiled_forms[0].integrals(module.lib.cell)[0]
+    A = np.zeros((3, 3), dtype=np.float64)
+    w = np.array([], dtype=np.float64)
+    c = np.array([], dtype=np.float64)
+    coords = np.array([[0.0, 0.0, 0.0],
+                       [1.0, 0.0, 0.0],
+                       [0.0, 1.0, 0.0]], dtype=np.float64)
+    default_integral.tabulate_tensor_float64(
+        ffi.cast('double *', A.ctypes.data), ffi.cast('double *', w.ctypes.data),
+        ffi.cast('double *', c.ctypes.data), ffi.cast('double *', coords.ctypes.data), ffi.NULL, ffi.NULL)
+
+    expected = np.array([[1.0 / 12.0, 1.0 / 24.0, 1.0 / 24.0], [1.0 / 24.0, 1.0 / 12.0, 1.0 / 24.0],
+                         [1.0 / 24.0, 1.0 / 24.0, 1.0 / 12.0]])
+    assert np.allclose(A, expected)
+    assert compiled_forms[1].num_integrals(module.lib.exterior_facet) == 1
+
+
 @pytest.mark.parametrize("mode", ["double", "double _Complex"])
 def test_interior_facet_integral(mode, compile_args):
     cell = ufl.triangle
@@ -649,3 +683,94 @@ def test_prism(compile_args):
            ffi.cast('double *', coords.ctypes.data), ffi.NULL, ffi.NULL)
 
     assert np.isclose(sum(b), 0.5)
+
+
+def test_batch(compile_args):
+    cell = ufl.triangle
+    element = ufl.FiniteElement("Lagrange", cell, 1)
+    velement = ufl.VectorElement("Lagrange", cell, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx
+    L = v * ufl.dx
+
+    mesh = ufl.Mesh(ufl.VectorElement("Lagrange", cell, 1))
+    f = ufl.Coefficient(ufl.FunctionSpace(mesh, element))
+    points = np.array([[0.0, 0.0], [1.0, 0.0]])
+
+    # Duplicates are compiled once, and small modules force several modules
+    objects, modules = ffcx.codegeneration.jit.compile_batch(
+        [a, element, (ufl.grad(f), points), L, a, velement], cffi_extra_compile_args=compile_args,
+        max_module_objects=2)
+
+    assert len(objects) == 6
+    assert objects[0] is objects[4]
+    assert objects[0].rank == 2 and objects[3].rank == 1
+    assert objects[1][0].space_dimension == 3 and objects[1][1].num_element_support_dofs == 3
+    assert objects[5][0].space_dimension == 12
+    assert objects[2].num_points == 2
+    assert len(set(m.__name__ for m in modules)) == 3
+
+
+def test_tiered(compile_args):
+    cell = ufl.tetrahedron
+    element = ufl.VectorElement("Lagrange", cell, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(ufl.sym(ufl.grad(u)), ufl.sym(ufl.grad(v))) * ufl.dx
+
+    tiered = ffcx.codegeneration.jit.compile_forms_tiered([a], cffi_extra_compile_args=compile_args)
+    assert tiered.objects[0].rank == 2
+    fast_module = tiered.fast[1]
+
+    _, module, _ = tiered.wait()
+    assert tiered.optimized_ready()
+    assert tiered.module is module
+    assert module.__name__ != fast_module.__name__
+
+
+def test_content_addressed_names(compile_args):
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = u * v * ufl.dx
+    b = u * v * ufl.dx + u * v * ufl.ds
+    parameters = ffcx.parameters.get_parameters({"content_addressed_names": True})
+
+    def integral_units(forms, prefix, extra_parameters):
+        code_h, units = ffcx.compiler.compile_ufl_objects(forms, prefix=prefix, split=True,
+                                                          parameters={**parameters, **extra_parameters})
+        return {name: source for name, source in units if name.startswith("integral_")}
+
+    # The cell integrals of a and b are the same, and generated once,
+    # with the same name and code whatever the other forms, the prefix
+    # and the options that are not FFCx parameters
+    alone = integral_units([a], "first", {"ufl_file": ["first.ufl"]})
+    both = integral_units([a, b], "second", {"ufl_file": ["second.ufl"]})
+    assert len(alone) == 1 and len(both) == 2
+    assert alone.items() <= both.items()
+    for source in both.values():
+        assert '#include "second.h"' not in source
+        assert "ufl_file" not in source
+        assert "#pragma weak integral_" in source and "#ifndef FFCX_DEFINED_integral_" in source
+
+    compiled_forms, module, code = ffcx.codegeneration.jit.compile_forms(
+        [a, b], parameters={"content_addressed_names": True}, cffi_extra_compile_args=compile_args)
+    cell_integrals = [form.integrals(module.lib.cell)[0] for form in compiled_forms]
+    assert cell_integrals[0] == cell_integrals[1]
+
+    A = np.zeros((3, 3), dtype=np.float64)
+    w = np.array([], dtype=np.float64)
+    coords = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], dtype=np.float64)
+    cell_integrals[1].tabulate_tensor_float64(
+        module.ffi.cast('double *', A.ctypes.data), module.ffi.cast('double *', w.ctypes.data), module.ffi.NULL,
+        module.ffi.cast('double *', coords.ctypes.data), module.ffi.NULL, module.ffi.NULL)
+    assert np.allclose(A, np.array([[2.0, 1.0, 1.0], [1.0, 2.0, 1.0], [1.0, 1.0, 2.0]]) / 24.0)
+
+
+def test_form_signature_not_memoized():
+    # Forms cache their own signature, and must not be kept alive (with
+    # their coefficients) by FFCx
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 1)
+    f = ufl.Coefficient(element)
+    a = f * ufl.dx
+    with ffcx.naming.signature_scope():
+        ffcx.naming.compute_signature([a], "")
+        assert all(obj is not a for obj, _ in ffcx.naming._signatures.get().values())
@@ -0,0 +1,81 @@
+# Copyright (C) 2021 FEniCS Project
+#
+# This file is part of FFCx. (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import numpy as np
+import pytest
+
+import ffcx.compiler
+import ffcx.parameters
+import ffcx.parallel
+import ufl
+
+
+def _forms():
+    P2 = ufl.VectorElement("Lagrange", ufl.triangle, 2)
+    P1 = ufl.FiniteElement("Lagrange", ufl.triangle, 1)
+    TH = ufl.MixedElement([P2, P1])
+    (u, p), (v, q) = ufl.TrialFunctions(TH), ufl.TestFunctions(TH)
+    f = ufl.Coefficient(P2)
+    c = ufl.Constant(ufl.triangle)
+    a = (ufl.inner(ufl.grad(u), ufl.grad(v)) - ufl.div(v) * p + ufl.div(u) * q) * ufl.dx \
+        + c * ufl.inner(u, v) * ufl.ds(1) + ufl.inner(ufl.jump(u), ufl.jump(v)) * ufl.dS
+    L = ufl.inner(f, v) * ufl.dx + ufl.inner(f, v) * ufl.ds(2) + c * q * ufl.dx(1)
+    return [a, L]
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_parallel_ir(mode):
+    forms = _forms()
+    serial = ffcx.compiler.compile_ufl_objects(forms, prefix="parallel",
+                                               parameters=ffcx.parameters.get_parameters())
+    parallel = ffcx.compiler.compile_ufl_objects(
+        forms, prefix="parallel",
+        parameters=ffcx.parameters.get_parameters({"workers": 3, "parallel_mode": mode}))
+    assert parallel == serial
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_parallel_codegen(mode):
+    P2 = ufl.VectorElement("Lagrange", ufl.triangle, 2)
+    f = ufl.Coefficient(P2)
+    points = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+    expressions = [(ufl.grad(f), points), (ufl.div(f) * f, points), (ufl.inner(f, f), points)]
+    elements = [P2, ufl.FiniteElement("N1curl", ufl.tetrahedron, 2), ufl.FiniteElement("DG", ufl.interval, 3)]
+
+    for objects in (expressions, elements):
+        serial = ffcx.compiler.compile_ufl_objects(objects, prefix="parallel",
+                                                   parameters=ffcx.parameters.get_parameters())
+        parallel = ffcx.compiler.compile_ufl_objects(
+            objects, prefix="parallel",
+            parameters=ffcx.parameters.get_parameters({"workers": 2, "parallel_mode": mode}))
+        assert parallel == serial
+
+
+def test_parallel_analysis():
+    element = ufl.FiniteElement("Lagrange", ufl.tetrahedron, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    kappa = ufl.Coefficient(element)
+    alpha = ufl.Constant(ufl.tetrahedron)
+    forms = [kappa * ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx, alpha * kappa * v * ufl.ds,
+             kappa**2 * ufl.dx, alpha * ufl.dS]
+    object_names = {id(kappa): "kappa", id(alpha): "alpha", id(forms[0]): "a"}
+
+    serial = ffcx.compiler.compile_ufl_objects(forms, object_names, prefix="analysis",
+                                               parameters=ffcx.parameters.get_parameters())
+    parallel = ffcx.compiler.compile_ufl_objects(
+        forms, object_names, prefix="analysis",
+        parameters=ffcx.parameters.get_parameters({"workers": 4, "parallel_mode": "process"}))
+    assert parallel == serial
+
+    # The names of the objects survive the analysis in other processes
+    assert '"kappa"' in parallel[1] and '"alpha"' in parallel[1]
+
+
+def test_parallel_map():
+    parameters = {"workers": 4, "parallel_mode": "thread"}
+    assert ffcx.parallel.parallel_map(abs, range(-10, 0), parameters) == list(range(10, 0, -1))
+    with pytest.raises(ValueError):
+        ffcx.parallel.parallel_map(abs, range(-10, 0), {"workers": 2, "parallel_mode": "fibre"})
@@ -0,0 +1,69 @@
+# Copyright (C) 2021 FEniCS Project
+#
+# This file is part of FFCx. (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import json
+
+import ffcx.compiler
+import ffcx.parameters
+import ffcx.profiling
+import ufl
+
+
+def test_profile_report(tmp_path):
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    f = ufl.Coefficient(element)
+    a = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx + f * u * v * ufl.ds(1)
+
+    code_h, code_c, report = ffcx.compiler.compile_ufl_objects(
+        [a], prefix="profile", parameters=ffcx.parameters.get_parameters(), profile=True)
+
+    assert set(report.stages) == {"analysis", "ir", "codegen", "formatting"}
+    assert all(stage["time"] > 0 for stage in report.stages.values())
+
+    integrals = report.by_object("integral")
+    assert len(integrals) == 2
+    for integral in integrals:
+        assert set(integral["stage_times"]) == {"ir", "codegen"}
+        assert integral["graph_nodes"] > 0
+        assert integral["unique_tables"] > 0
+        assert integral["quadrature_points"] > 0
+        assert integral["c_lines"] > 0
+    assert integrals[0]["time"] >= integrals[1]["time"]
+
+    # A form is profiled under the same name in all stages
+    forms = report.by_object("form")
+    assert len(forms) == 1
+    assert set(forms[0]["stage_times"]) == {"analysis", "ir", "codegen"}
+
+    report.to_json(tmp_path / "report.json")
+    data = json.loads((tmp_path / "report.json").read_text())
+    assert len(data["objects"]) == len(report.objects)
+
+    # Without profile, only the code is returned
+    assert len(ffcx.compiler.compile_ufl_objects([a], prefix="profile",
+                                                 parameters=ffcx.parameters.get_parameters())) == 2
+
+
+def test_trace(tmp_path):
+    element = ufl.VectorElement("Lagrange", ufl.tetrahedron, 1)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    a = ufl.inner(ufl.grad(u), ufl.grad(v)) * ufl.dx
+
+    assert ffcx.profiling.span("stage", "analysis") is ffcx.profiling.step("compute_form_data")
+
+    with ffcx.profiling.tracing(tmp_path / "trace.json"):
+        ffcx.compiler.compile_ufl_objects([a], prefix="trace", parameters=ffcx.parameters.get_parameters())
+
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    spans = [e for e in events if e["ph"] == "X"]
+    names = {e["name"] for e in spans}
+    assert {"analysis", "ir", "codegen", "formatting", "compute_form_data", "build_optimized_tables"} <= names
+
+    # Steps are nested within their stage
+    stage = next(e for e in spans if e["name"] == "ir")
+    step = next(e for e in spans if e["name"] == "build_optimized_tables")
+    assert stage["ts"] <= step["ts"] and step["ts"] + step["dur"] <= stage["ts"] + stage["dur"]
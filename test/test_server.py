@@ -0,0 +1,91 @@
+# Copyright (C) 2021 FEniCS Project
+#
+# This file is part of FFCx. (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import os.path
+import threading
+import time
+
+import pytest
+
+import ffcx.compiler
+import ffcx.parameters
+import ffcx.server
+import ufl
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    # The socket must be in a directory private to the user
+    directory = tmp_path / "server"
+    directory.mkdir(mode=0o700)
+    directory.chmod(0o700)
+    path = directory / "ffcx.sock"
+    thread = threading.Thread(target=ffcx.server.serve, args=(path,), daemon=True)
+    thread.start()
+    for i in range(100):
+        if path.exists():
+            break
+        time.sleep(0.1)
+    yield path
+    ffcx.server.request({"command": "shutdown"}, path)
+    thread.join()
+    assert not path.exists()
+
+
+def _form():
+    element = ufl.FiniteElement("Lagrange", ufl.triangle, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    kappa = ufl.Coefficient(element)
+    return ufl.inner(kappa * ufl.grad(u), ufl.grad(v)) * ufl.dx, kappa
+
+
+def test_compile(socket_path):
+    assert "pid" in ffcx.server.request({"command": "ping"}, socket_path)
+
+    form, kappa = _form()
+    object_names = {id(form): "a", id(kappa): "kappa"}
+    parameters = ffcx.parameters.get_parameters()
+    expected = ffcx.compiler.compile_ufl_objects([form], object_names, prefix="test", parameters=parameters)
+
+    # Twice, the second time with warm caches
+    for i in range(2):
+        code = ffcx.server.compile_objects([form], "test", object_names, parameters, socket_path=socket_path)
+        assert code == expected
+
+    ufl_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Poisson.ufl")
+    code = ffcx.server.compile_file(ufl_file, "Poisson", parameters, socket_path=socket_path)
+    assert code == ffcx.server.compile_source(open(ufl_file).read(), "Poisson", parameters, socket_path)
+
+
+def test_jit(socket_path, tmp_path):
+    form, kappa = _form()
+    module = ffcx.server.compile_jit("forms", [form], socket_path, cache_dir=tmp_path / "cache")
+    assert os.path.isfile(module)
+    assert os.path.dirname(module) == str(tmp_path / "cache")
+
+
+def test_error(socket_path):
+    with pytest.raises(RuntimeError, match="Unknown command"):
+        ffcx.server.request({"command": "unknown"}, socket_path)
+
+    # The server still handles requests after an error
+    ffcx.server.request({"command": "ping"}, socket_path)
+
+
+def test_private_directory(tmp_path):
+    # A socket in a directory that other users can write to is refused
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o777)
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        ffcx.server.request({"command": "ping"}, shared / "ffcx.sock")
+    with pytest.raises(PermissionError):
+        ffcx.server.serve(shared / "ffcx.sock")
+
+    link = tmp_path / "link"
+    link.symlink_to(tmp_path)
+    with pytest.raises(PermissionError):
+        ffcx.server.request({"command": "ping"}, link / "ffcx.sock")
@@ -0,0 +1,52 @@
+# Copyright (C) 2021 FEniCS Project
+#
+# This file is part of FFCx. (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+# Time (in seconds) that "import ffcx" may add to the startup of the
+# interpreter. Wall-clock times depend on the machine and its load, so
+# the benchmark only runs with FFCX_BENCHMARK set.
+IMPORT_BUDGET = 0.25
+
+
+def _run(code):
+    return subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+
+
+def _startup_time(code, repeat=5):
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        _run(code)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def test_lazy_imports():
+    modules = _run("import sys, ffcx; print(' '.join(sys.modules))").split()
+    for module in ("cffi", "basix", "numpy", "ufl"):
+        assert module not in modules
+
+    # On Python 3.7, the version is read with pkg_resources
+    if sys.version_info >= (3, 8):
+        assert "pkg_resources" not in modules
+
+    # The JIT parses ufc.h and imports cffi and UFL only when compiling
+    out = _run("import sys, ffcx.codegeneration.jit as jit;"
+               "print('cffi' in sys.modules, 'ufl' in sys.modules, 'numpy' in sys.modules,"
+               "jit._ufc_declarations.cache_info().currsize)")
+    assert out.split() == ["False", "False", "False", "0"]
+
+
+@pytest.mark.skipif(not os.environ.get("FFCX_BENCHMARK"), reason="set FFCX_BENCHMARK to run benchmarks")
+def test_import_time():
+    baseline = _startup_time("pass")
+    assert _startup_time("import ffcx") - baseline < IMPORT_BUDGET
@@ -0,0 +1,67 @@
+# Copyright (C) 2021 FEniCS Project
+#
+# This file is part of FFCx. (https://www.fenicsproject.org)
+#
+# SPDX-License-Identifier:    LGPL-3.0-or-later
+
+import tracemalloc
+
+import ffcx.compiler
+import ffcx.parameters
+import ufl
+
+
+def _form(num_integrals):
+    element = ufl.VectorElement("Lagrange", ufl.tetrahedron, 2)
+    u, v = ufl.TrialFunction(element), ufl.TestFunction(element)
+    f = ufl.Coefficient(element)
+    F = ufl.Identity(3) + ufl.grad(f)
+    return sum(ufl.inner(ufl.dot(F, ufl.grad(u)), ufl.grad(v)) * ufl.det(F) * ufl.dx(i)
+               for i in range(num_integrals))
+
+
+def _stream(form, path):
+    with open(path / "stream.h", "w") as file_h, open(path / "stream.c", "w") as file_c:
+        ffcx.compiler.stream_ufl_objects([form], file_h, file_c, prefix="stream",
+                                         parameters=ffcx.parameters.get_parameters())
+
+
+def _compile(form, path):
+    code_h, code_c = ffcx.compiler.compile_ufl_objects([form], prefix="stream",
+                                                       parameters=ffcx.parameters.get_parameters())
+    (path / "compile.h").write_text(code_h)
+    (path / "compile.c").write_text(code_c)
+
+
+def _peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_stream(tmp_path):
+    form = _form(3)
+    timings = {}
+    with open(tmp_path / "stream.h", "w") as file_h, open(tmp_path / "stream.c", "w") as file_c:
+        ffcx.compiler.stream_ufl_objects([form], file_h, file_c, prefix="stream",
+                                         parameters=ffcx.parameters.get_parameters(), timings=timings)
+    assert set(timings) == {"analysis", "ir", "codegen", "formatting"}
+
+    _compile(form, tmp_path)
+    assert (tmp_path / "stream.h").read_text() == (tmp_path / "compile.h").read_text()
+    assert (tmp_path / "stream.c").read_text() == (tmp_path / "compile.c").read_text()
+
+
+def test_stream_peak_memory(tmp_path):
+    # Fill the caches of elements, tables, etc. first
+    _stream(_form(1), tmp_path)
+
+    few, many = _form(2), _form(8)
+    stream_growth = _peak_memory(_stream, many, tmp_path) - _peak_memory(_stream, few, tmp_path)
+    compile_growth = _peak_memory(_compile, many, tmp_path) - _peak_memory(_compile, few, tmp_path)
+
+    # Only the analysis grows with the number of integrals when streaming
+    assert stream_growth < 0.5 * compile_growth